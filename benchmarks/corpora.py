@@ -0,0 +1,117 @@
+import os
+import random
+
+# 合成测试语料，固定随机种子保证每次生成的内容一致
+
+CJK = '的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可也你说年同'
+LATIN = ['layout', 'render', 'card', 'page', 'font', 'cache', 'markdown', 'pillow', 'image', 'text']
+MARKER = '[[PAGE_BREAK]]'
+
+
+def cjk_sentence(rng, n):
+    return ''.join(rng.choice(CJK) for _ in range(n)) + '。'
+
+
+def mixed_sentence(rng, n):
+    words = []
+    for _ in range(n):
+        words.append(rng.choice(LATIN) if rng.random() < 0.3 else cjk_sentence(rng, rng.randint(4, 12))[:-1])
+    return ' '.join(words) + '。'
+
+
+def long_cjk(rng, scale):
+    paras = []
+    for _ in range(8 * scale):
+        paras.append(''.join(cjk_sentence(rng, rng.randint(15, 40)) for _ in range(rng.randint(6, 12))))
+    return '# 长段落\n\n' + '\n\n'.join(paras) + '\n'
+
+
+def lists(rng, scale):
+    parts = []
+    for i in range(10 * scale):
+        parts.append(f'## 列表 {i + 1}\n')
+        parts.append('\n'.join('- ' + mixed_sentence(rng, rng.randint(2, 6)) for _ in range(rng.randint(5, 12))))
+        parts.append('')
+    return '\n'.join(parts) + '\n'
+
+
+def blockquotes(rng, scale):
+    parts = []
+    for _ in range(30 * scale):
+        parts.append('> ' + mixed_sentence(rng, rng.randint(3, 10)))
+        parts.append('')
+        parts.append(cjk_sentence(rng, rng.randint(20, 60)))
+        parts.append('')
+    return '\n'.join(parts)
+
+
+def tables(rng, scale):
+    parts = []
+    for i in range(6 * scale):
+        cols = rng.randint(3, 5)
+        parts.append(f'### 表格 {i + 1}\n')
+        parts.append('| ' + ' | '.join(f'列{c + 1}' for c in range(cols)) + ' |')
+        parts.append('|' + '---|' * cols)
+        for _ in range(rng.randint(5, 15)):
+            parts.append('| ' + ' | '.join(mixed_sentence(rng, 1)[:-1] for _ in range(cols)) + ' |')
+        parts.append('')
+    return '\n'.join(parts) + '\n'
+
+
+def code(rng, scale):
+    parts = []
+    for i in range(10 * scale):
+        parts.append(f'代码示例 {i + 1}：')
+        parts.append('')
+        parts.append('```python')
+        for j in range(rng.randint(5, 25)):
+            parts.append('    ' * rng.randint(0, 3) + f'value_{j} = {rng.choice(LATIN)}({j}, "{rng.choice(LATIN)}")')
+        parts.append('```')
+        parts.append('')
+    return '\n'.join(parts)
+
+
+def many_breaks(rng, scale):
+    sections = []
+    for i in range(40 * scale):
+        sections.append(f'## 第 {i + 1} 节\n\n' + cjk_sentence(rng, rng.randint(30, 120)) + '\n')
+    return ('\n' + MARKER + '\n').join(sections)
+
+
+def images(rng, scale, image_dir):
+    from PIL import Image, ImageDraw
+    os.makedirs(image_dir, exist_ok=True)
+    parts = []
+    for i in range(8 * scale):
+        path = os.path.join(image_dir, f'img_{i:03d}.jpg')
+        if not os.path.exists(path):
+            w, h = rng.choice([(1600, 1200), (2400, 1600), (1200, 1800)])
+            img = Image.new('RGB', (w, h), (rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+            draw = ImageDraw.Draw(img)
+            for _ in range(20):
+                x, y = rng.randrange(w), rng.randrange(h)
+                draw.ellipse([x, y, x + 200, y + 200], fill=(rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+            img.save(path, quality=90)
+        parts.append(f'![图 {i + 1}]({path})')
+        parts.append('')
+        parts.append(cjk_sentence(rng, rng.randint(20, 60)))
+        parts.append('')
+    return '\n'.join(parts)
+
+
+CORPORA = {
+    'long_cjk': long_cjk,
+    'lists': lists,
+    'blockquotes': blockquotes,
+    'tables': tables,
+    'code': code,
+    'many_breaks': many_breaks,
+    'images': images,
+}
+
+
+def generate(name, scale=1, image_dir=None, seed=0):
+    rng = random.Random(f'{name}:{seed}')
+    if name == 'images':
+        return images(rng, scale, image_dir)
+    return CORPORA[name](rng, scale)
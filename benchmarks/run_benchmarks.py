@@ -0,0 +1,189 @@
+"""md2card 性能基准：分阶段计时 parse → layout → paginate → render → encode。
+
+    python benchmarks/run_benchmarks.py --output bench.json
+    python benchmarks/run_benchmarks.py --compare bench.json --threshold 0.15
+
+默认使用仓库自带的 Aileron 字体（CC0），离线可运行；用 --font 指定中文字体可以得到更接近线上的数据。
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import corpora  # noqa: E402
+
+DEFAULT_FONT = os.path.join(HERE, 'fonts', 'Aileron-Regular.ttf')
+STAGES = ['parse', 'layout', 'paginate', 'render', 'encode']
+
+
+def bench_template(font_path):
+    from md2card.templates import Template
+    with open(os.path.join(os.path.dirname(HERE), 'default_template.json'), 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    config['font_path'] = font_path
+    return Template(config)
+
+
+def run_once(text, template, options):
+    from md2card.core import parse_document
+    from md2card.layout import layout_ast, paginate_blocks
+    from md2card.markdown_render import rasterize_page
+
+    timings = dict.fromkeys(STAGES, 0.0)
+    t = time.perf_counter()
+    asts = parse_document(text)
+    timings['parse'] = time.perf_counter() - t
+
+    pages = []
+    for ast in asts:
+        t = time.perf_counter()
+        blocks = layout_ast(ast, template)
+        timings['layout'] += time.perf_counter() - t
+        t = time.perf_counter()
+        pages.extend(paginate_blocks(blocks, template))
+        timings['paginate'] += time.perf_counter() - t
+
+    total_bytes = 0
+    for page in pages:
+        t = time.perf_counter()
+        img = rasterize_page(page, template)
+        timings['render'] += time.perf_counter() - t
+        t = time.perf_counter()
+        total_bytes += len(options.encode(img))
+        timings['encode'] += time.perf_counter() - t
+    return timings, len(pages), total_bytes
+
+
+def peak_rss_kb():
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 返回字节，Linux 返回 KB
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+def bench_corpus(name, scale, repeat, font_path, image_dir):
+    from md2card.encode import OutputOptions
+    text = corpora.generate(name, scale, image_dir=image_dir)
+    template = bench_template(font_path)
+    options = OutputOptions()
+    runs = []
+    # 第一次运行包含字体加载等冷启动开销，单独记录
+    cold, pages, total_bytes = run_once(text, template, options)
+    for _ in range(repeat):
+        runs.append(run_once(text, template, options)[0])
+    best = {stage: min(r[stage] for r in runs) for stage in STAGES} if runs else cold
+    total = sum(best.values())
+    return {
+        'chars': len(text),
+        'pages': pages,
+        'bytes': total_bytes,
+        'cold_ms': {stage: cold[stage] * 1000 for stage in STAGES},
+        'stages_ms': {stage: best[stage] * 1000 for stage in STAGES},
+        'total_ms': total * 1000,
+        'pages_per_second': pages / total if total else 0.0,
+        'peak_rss_kb': peak_rss_kb(),
+    }
+
+
+def _child(queue, *args):
+    try:
+        queue.put(('ok', bench_corpus(*args)))
+    except Exception as e:
+        queue.put(('error', repr(e)))
+
+
+def run_isolated(*args):
+    # 每个语料在独立进程中运行，峰值内存互不影响
+    ctx = multiprocessing.get_context('spawn')
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_child, args=(queue,) + args)
+    proc.start()
+    status, result = queue.get()
+    proc.join()
+    if status != 'ok':
+        raise RuntimeError(result)
+    return result
+
+
+def environment(font_path, scale, repeat):
+    import mistune
+    import PIL
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'pillow': PIL.__version__,
+        'mistune': getattr(mistune, '__version__', 'unknown'),
+        'font': os.path.basename(font_path),
+        'scale': scale,
+        'repeat': repeat,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def compare(baseline, current, threshold):
+    # 返回回归项列表：总耗时或任一阶段比基线慢 threshold 以上
+    regressions = []
+    for name, cur in current['corpora'].items():
+        base = baseline.get('corpora', {}).get(name)
+        if not base:
+            continue
+        print(f"{name}:")
+        for stage in STAGES + ['total']:
+            b = base['total_ms'] if stage == 'total' else base['stages_ms'].get(stage, 0.0)
+            c = cur['total_ms'] if stage == 'total' else cur['stages_ms'].get(stage, 0.0)
+            ratio = c / b if b else 1.0
+            flag = ''
+            # 小于 1ms 的阶段噪声太大，不参与判断
+            if b >= 1.0 and ratio > 1 + threshold:
+                flag = '  <-- regression'
+                regressions.append((name, stage, ratio))
+            print(f"  {stage:<9} {b:10.1f} ms -> {c:10.1f} ms  x{ratio:.2f}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='md2card pipeline benchmarks')
+    parser.add_argument('--corpus', action='append', choices=sorted(corpora.CORPORA),
+                        help='Corpus to run (repeatable, default: all)')
+    parser.add_argument('--scale', type=int, default=1, help='Corpus size multiplier')
+    parser.add_argument('--repeat', type=int, default=3, help='Warm runs per corpus (best is reported)')
+    parser.add_argument('--font', default=DEFAULT_FONT, help='Font file used for the benchmark template')
+    parser.add_argument('--output', help='Write results JSON to this path')
+    parser.add_argument('--compare', help='Baseline results JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=0.15, help='Allowed slowdown before flagging (0.15 = 15%%)')
+    args = parser.parse_args(argv)
+
+    names = args.corpus or sorted(corpora.CORPORA)
+    image_dir = os.path.join(tempfile.gettempdir(), 'md2card-bench-images')
+    results = {'environment': environment(args.font, args.scale, args.repeat), 'corpora': {}}
+    for name in names:
+        r = run_isolated(name, args.scale, args.repeat, args.font, image_dir)
+        results['corpora'][name] = r
+        stages = ' '.join(f"{s}={r['stages_ms'][s]:.1f}" for s in STAGES)
+        print(f"{name:<12} {r['pages']:4d} pages {r['total_ms']:9.1f} ms "
+              f"{r['pages_per_second']:7.2f} pages/s rss={r['peak_rss_kb'] / 1024:.1f}MB  [{stages}]")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, results, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) over {args.threshold:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
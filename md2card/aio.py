@@ -0,0 +1,108 @@
+import asyncio
+from collections import deque
+from .core import Card, layout_document, load_template
+from .encode import OutputOptions
+from .markdown_render import rasterize_items, _worker_template
+from .templates import Template
+
+
+def _layout_task(config, md_text, marker):
+    return layout_document(md_text, _worker_template(config), marker)
+
+
+def _card_task(config, items, output):
+    # 在 executor 中绘制并按需编码；进程池中模板和字体按配置在每个进程缓存一次
+    img = rasterize_items(items, _worker_template(config))
+    data = OutputOptions.from_config(output).encode(img) if output else None
+    return img, data
+
+
+class AsyncRenderer:
+    """asyncio 接口：解析排版、绘制和编码都在 executor 中执行，不阻塞事件循环。
+
+    executor 为 None 时使用事件循环默认的线程池，也可以传入 ProcessPoolExecutor；
+    同时进行的渲染数不超过 max_concurrent，每个渲染最多 prefetch 页在途。
+    迭代被取消或提前结束时，尚未开始的页不再绘制。
+    传入的 executor 由渲染器负责关闭：await renderer.aclose() 或 async with renderer。
+    """
+
+    def __init__(self, executor=None, max_concurrent=4, prefetch=2):
+        self.executor = executor
+        self.max_concurrent = max_concurrent
+        self.prefetch = max(1, prefetch)
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        # 模板路径 -> 配置，任务只传配置，模板对象和字体在执行的线程/进程里按配置共用
+        self._configs = {}
+
+    def template_config(self, template):
+        if isinstance(template, Template):
+            return template.config
+        config = self._configs.get(template)
+        if config is None:
+            config = self._configs[template] = load_template(template).config
+        return config
+
+    async def iter_cards(self, md_text, template=None, marker='[[PAGE_BREAK]]', encode=None, **encode_params):
+        # 逐页产出 Card；encode 同 iter_cards，可以是格式名或 OutputOptions
+        loop = asyncio.get_running_loop()
+        options = OutputOptions(format=encode, **encode_params) if isinstance(encode, str) else encode
+        output = options.to_config() if options else None
+        async with self._semaphore:
+            config = await loop.run_in_executor(None, self.template_config, template)
+            pages = await loop.run_in_executor(self.executor, _layout_task, config, md_text, marker)
+            pending = deque()
+            try:
+                for index, page in enumerate(pages, 1):
+                    future = loop.run_in_executor(self.executor, _card_task, config, page.items, output)
+                    pending.append((index, page, future))
+                    if len(pending) >= self.prefetch:
+                        yield await self._card(options, *pending.popleft())
+                while pending:
+                    yield await self._card(options, *pending.popleft())
+            finally:
+                # 取消还没开始执行的页；已在执行的页完成后结果直接丢弃
+                for _, _, future in pending:
+                    future.cancel()
+
+    async def aclose(self):
+        # 等在途任务结束后关闭 executor；默认线程池归事件循环管，不在这里关闭
+        if self.executor is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self.executor.shutdown)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def _card(self, options, index, page, future):
+        img, data = await future
+        return Card(index, img, page, data, options.extension if options else None)
+
+    async def render_cards(self, md_text, template=None, marker='[[PAGE_BREAK]]', encode=None, **encode_params):
+        return [card async for card in self.iter_cards(md_text, template, marker, encode, **encode_params)]
+
+
+_default = None
+
+
+def default_renderer():
+    # 进程内共用一个渲染器（并发上限对所有调用生效）；事件循环换了就重新创建
+    global _default
+    loop = asyncio.get_running_loop()
+    if _default is None or _default[0] is not loop:
+        _default = (loop, AsyncRenderer())
+    return _default[1]
+
+
+def iter_cards_async(md_text, template=None, marker='[[PAGE_BREAK]]', encode=None, renderer=None, **encode_params):
+    """async for card in iter_cards_async(md_text, 'template.json', encode='png'): ..."""
+    return (renderer or default_renderer()).iter_cards(md_text, template, marker, encode, **encode_params)
+
+
+async def render_cards_async(md_text, template=None, marker='[[PAGE_BREAK]]', encode=None, renderer=None,
+                             **encode_params):
+    """cards = await render_cards_async(md_text, 'template.json', encode='webp', quality=80)"""
+    renderer = renderer or default_renderer()
+    return await renderer.render_cards(md_text, template, marker, encode, **encode_params)
+
@@ -0,0 +1,187 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from . import stats
+from .stats import logger
+
+try:
+    import fcntl
+except ImportError:  # Windows 上没有 fcntl，退化为只在进程内加锁
+    fcntl = None
+
+DEFAULT_CACHE_BYTES = 512 * 1024 * 1024
+
+
+def file_identity(path):
+    # 文件身份用 (路径, 大小, 修改时间)，字体或图片被替换后缓存自然失效
+    try:
+        st = os.stat(path)
+    except (OSError, TypeError):
+        return (path, None, None)
+    return (path, st.st_size, st.st_mtime_ns)
+
+
+def page_key(items, template, options, scale=1):
+    """页面内容 + 模板配置 + 字体/图片文件身份 + 编码参数 + 缩放比例 的哈希。"""
+    fonts = {template.font_path}
+    images = set()
+    for item in items:
+        font = getattr(item, 'font', None)
+        if font is not None:
+            fonts.add(font[0])
+        src = getattr(item, 'src', None)
+        if src is not None:
+            images.add(src)
+    h = hashlib.sha256()
+    h.update(repr(items).encode('utf-8'))
+    h.update(json.dumps(template.config, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+    h.update(json.dumps(options.to_config(), sort_keys=True).encode('utf-8'))
+    h.update(repr(scale).encode('utf-8'))
+    for path in sorted(fonts | images | {template.background_image}, key=str):
+        h.update(repr(file_identity(path)).encode('utf-8'))
+    return h.hexdigest()
+
+
+class RenderCache:
+    """按内容寻址的磁盘缓存，保存编码好的页面文件。
+
+    写入先落到同目录的临时文件再 os.replace，多个进程同时写同一个键也不会读到半个文件；
+    命中时更新文件的 mtime，超过 max_bytes 时按 mtime 淘汰最久未用的条目。
+    缓存总大小记在目录下的 .size 文件里，各进程在 .lock 文件锁内更新，互相看得到对方的写入。
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        with self._locked():
+            self._size = self._scan_size()
+            self._write_size(self._size)
+
+    @contextmanager
+    def _locked(self):
+        # 进程内用线程锁，进程间用 flock；每次重新打开锁文件，fork 出的子进程不会共用同一把锁
+        with self._lock:
+            with open(os.path.join(self.directory, '.lock'), 'a') as f:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                yield
+
+    def _read_size(self):
+        try:
+            with open(os.path.join(self.directory, '.size')) as f:
+                return int(f.read())
+        except (OSError, ValueError):
+            return self._scan_size()
+
+    def _write_size(self, size):
+        with open(os.path.join(self.directory, '.size'), 'w') as f:
+            f.write(str(size))
+
+    def _path(self, key, extension):
+        return os.path.join(self.directory, key[:2], f'{key}.{extension}')
+
+    def _entries(self):
+        for sub in os.scandir(self.directory):
+            if not sub.is_dir():
+                continue
+            for entry in os.scandir(sub.path):
+                if entry.name.startswith('.'):
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                yield entry.path, st.st_size, st.st_mtime_ns
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def fetch(self, key, extension, dest):
+        # 命中时把缓存文件复制到 dest，返回字节数；未命中返回 None
+        path = self._path(key, extension)
+        try:
+            shutil.copyfile(path, dest)
+            os.utime(path)
+        except FileNotFoundError:
+            stats.count('cache_misses')
+            return None
+        stats.count('cache_hits')
+        return os.path.getsize(dest)
+
+    def read(self, key, extension):
+        # 命中时返回编码好的字节，未命中返回 None
+        path = self._path(key, extension)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            stats.count('cache_misses')
+            return None
+        stats.count('cache_hits')
+        return data
+
+    def store(self, key, extension, src):
+        def copy(f):
+            with open(src, 'rb') as s:
+                shutil.copyfileobj(s, f)
+        self._put(key, extension, copy)
+
+    def write(self, key, extension, data):
+        self._put(key, extension, lambda f: f.write(data))
+
+    def _put(self, key, extension, fill):
+        path = self._path(key, extension)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                fill(f)
+            size = os.path.getsize(tmp)
+            with self._locked():
+                # 覆盖已有条目时只增加差值
+                try:
+                    old = os.path.getsize(path)
+                except FileNotFoundError:
+                    old = 0
+                os.replace(tmp, path)
+                self._size = self._read_size() + size - old
+                if self._size > self.max_bytes:
+                    self._evict()
+                else:
+                    self._write_size(self._size)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def evict(self):
+        with self._locked():
+            self._evict()
+
+    def _evict(self):
+        # 调用方持有锁；按目录实际内容重新计算大小，顺便纠正 .size 的偏差
+        entries = sorted(self._entries(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        removed = 0
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        self._size = total
+        self._write_size(total)
+        if removed:
+            stats.count('cache_evictions', removed)
+            logger.debug("渲染缓存淘汰 %d 个文件", removed)
@@ -1,15 +1,198 @@
 import argparse
-from .core import generate_cards
+import logging
+import sys
+from contextlib import nullcontext
+from .core import generate_cards, generate_cards_batch, generate_cards_multi
+from .container import CONTAINERS
+from .encode import format_report
+from .stats import collect_stats, format_stats
 
-def main():
-    parser = argparse.ArgumentParser(description='Convert article to Xiaohongshu image cards')
+def add_common_arguments(parser):
+    parser.add_argument('-v', '--verbose', action='store_true', help='Show debug logging')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Only show warnings and errors')
+    parser.add_argument('--stats', choices=['text', 'json'], default=None,
+                        help='Print stage timings and hot-path counters when done')
+
+def setup_logging(args):
+    # 只放开 md2card 自己的调试日志，不打开 PIL 等依赖的
+    logging.basicConfig(level=logging.WARNING if args.quiet else logging.INFO, format='%(message)s')
+    level = logging.DEBUG if args.verbose else logging.WARNING if args.quiet else logging.INFO
+    logging.getLogger('md2card').setLevel(level)
+
+def run_with_stats(args, func):
+    # --stats json 时标准输出只保留 JSON，其余信息写到标准错误
+    out = sys.stderr if args.stats == 'json' else sys.stdout
+    with (collect_stats() if args.stats else nullcontext()) as collected:
+        result = func(out)
+    if collected is not None:
+        print(format_stats(collected.snapshot(), args.stats))
+    return result
+
+def add_output_arguments(parser):
+    parser.add_argument('--jobs', type=int, default=1, help='Parallel render processes (0 = all CPUs)')
+    parser.add_argument('--format', choices=['png', 'webp', 'jpeg'], default=None, help='Output image format')
+    parser.add_argument('--compress-level', type=int, default=None, help='PNG zlib level 0-9')
+    parser.add_argument('--optimize', action='store_true', default=None, help='PNG/JPEG optimize pass')
+    parser.add_argument('--quality', type=int, default=None, help='WebP/JPEG quality')
+    parser.add_argument('--lossless', action='store_true', default=None, help='Lossless WebP')
+    parser.add_argument('--palette', type=int, default=None, help='Quantize PNG to N colors (0 = off)')
+    parser.add_argument('--encode-threads', type=int, default=2, help='Encoder threads (0 = encode inline)')
+    parser.add_argument('--cache-dir', default=None, help='Reuse rendered pages from this on-disk cache')
+    parser.add_argument('--cache-size', type=int, default=512, help='Render cache size limit in MB')
+
+def add_scale_argument(parser):
+    parser.add_argument('--scale', type=float, action='append', default=None,
+                        help='Also render every page at this scale factor, e.g. --scale 1 --scale 2 --scale 0.25 (repeatable)')
+
+def add_container_argument(parser):
+    parser.add_argument('--container', choices=sorted(CONTAINERS), default=None,
+                        help='Write all pages of an article into one file: multi-page PDF, multi-frame WebP/TIFF, '
+                             'or zip/tar with a manifest.json')
+
+def check_container_arguments(parser, args):
+    # 容器整篇写成一个文件，不经过按页的渲染缓存
+    if args.container and args.cache_dir:
+        parser.error('--container cannot be combined with --cache-dir')
+
+def output_overrides(args):
+    return {
+        'format': args.format,
+        'compress_level': args.compress_level,
+        'optimize': args.optimize,
+        'quality': args.quality,
+        'lossless': args.lossless,
+        'palette': args.palette,
+    }
+
+def batch_main(argv):
+    parser = argparse.ArgumentParser(prog='md2card batch', description='Convert a directory or JSONL manifest of articles in one process')
+    parser.add_argument('source', help='Directory of markdown files or a manifest .jsonl')
+    parser.add_argument('--template', help='Path to template JSON', default=None)
+    parser.add_argument('--output', help='Output root directory', default='cards')
+    parser.add_argument('--marker', default='[[PAGE_BREAK]]', help='Manual page break marker')
+    add_output_arguments(parser)
+    add_scale_argument(parser)
+    add_container_argument(parser)
+    add_common_arguments(parser)
+    args = parser.parse_args(argv)
+    check_container_arguments(parser, args)
+    setup_logging(args)
+
+    def run(out):
+        summary = generate_cards_batch(args.source, args.output, args.template, args.marker, jobs=args.jobs,
+                                       output=output_overrides(args), encode_threads=args.encode_threads,
+                                       cache_dir=args.cache_dir, cache_bytes=args.cache_size * 1024 * 1024,
+                                       scales=args.scale, container=args.container)
+        for r in summary['results']:
+            status = r.get('error') or f"{r['pages']} pages"
+            print(f"{r['input']} -> {r['output']}: {status} ({r['seconds']:.2f}s)", file=out)
+        print(f"{summary['succeeded']}/{summary['documents']} documents, {summary['pages']} pages in {summary['seconds']:.2f}s "
+              f"({summary['documents_per_second']:.2f} docs/s, {summary['pages_per_second']:.2f} pages/s)", file=out)
+        return 1 if summary['failed'] else 0
+    return run_with_stats(args, run)
+
+def watch_main(argv):
+    from .watch import watch
+    parser = argparse.ArgumentParser(prog='md2card watch', description='Re-render only the changed pages whenever the input file is saved')
     parser.add_argument('input', help='Path to input text or markdown file')
     parser.add_argument('--template', help='Path to template JSON', default=None)
     parser.add_argument('--output', help='Output directory', default='cards')
+    parser.add_argument('--marker', default='[[PAGE_BREAK]]', help='Manual page break marker')
+    parser.add_argument('--interval', type=float, default=0.3, help='Polling interval in seconds')
+    add_output_arguments(parser)
+    add_common_arguments(parser)
+    args = parser.parse_args(argv)
+    setup_logging(args)
+
+    def run(out):
+        try:
+            watch(args.input, args.output, args.template, args.marker, args.interval,
+                  output=output_overrides(args), encode_threads=args.encode_threads)
+        except KeyboardInterrupt:
+            pass
+        return 0
+    return run_with_stats(args, run)
+
+def serve_main(argv):
+    from .server import serve
+    parser = argparse.ArgumentParser(prog='md2card serve', description='Run a resident render server (POST /render, GET /health)')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=8765, help='TCP port to listen on')
+    parser.add_argument('--socket', default=None, help='Listen on this Unix socket instead of TCP')
+    parser.add_argument('--template', default=None, help='Template used when a request names none')
+    parser.add_argument('--templates-dir', default=None, help='Directory of template JSON files selectable by name')
+    parser.add_argument('--max-queue', type=int, default=16, help='Requests accepted before answering 503')
+    parser.add_argument('--max-body', type=int, default=16, help='Largest accepted request body in MB (413 above)')
+    add_output_arguments(parser)
+    add_common_arguments(parser)
+    args = parser.parse_args(argv)
+    setup_logging(args)
+
+    def run(out):
+        try:
+            serve(args.host, args.port, args.socket, templates_dir=args.templates_dir, jobs=args.jobs,
+                  max_queue=args.max_queue, output=output_overrides(args), encode_threads=args.encode_threads,
+                  cache_dir=args.cache_dir, cache_bytes=args.cache_size * 1024 * 1024,
+                  default_template=args.template, max_body=args.max_body * 1024 * 1024)
+        except KeyboardInterrupt:
+            pass
+        return 0
+    return run_with_stats(args, run)
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == 'batch':
+        sys.exit(batch_main(argv[1:]))
+    if argv and argv[0] == 'watch':
+        sys.exit(watch_main(argv[1:]))
+    if argv and argv[0] == 'serve':
+        sys.exit(serve_main(argv[1:]))
+    parser = argparse.ArgumentParser(description='Convert article to Xiaohongshu image cards')
+    parser.add_argument('input', help='Path to input text or markdown file')
+    parser.add_argument('--template', action='append', default=None,
+                        help='Path to template JSON; repeat to render every template into its own subdirectory')
+    parser.add_argument('--output', help='Output directory', default='cards')
     parser.add_argument('--max_chars', type=int, default=1000, help='Max chars per page')
     parser.add_argument('--marker', default='[[PAGE_BREAK]]', help='Manual page break marker')
-    args = parser.parse_args()
-    generate_cards(args.input, args.output, args.template, args.max_chars, args.marker)
+    add_output_arguments(parser)
+    parser.add_argument('--encode-report', action='store_true', help='Print bytes and encode time per page')
+    add_scale_argument(parser)
+    add_container_argument(parser)
+    parser.add_argument('--stream', action='store_true',
+                        help='Read, lay out and render page by page with constant memory (for very long documents)')
+    add_common_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.stream:
+        # 流式模式逐页排版绘制，不保留整篇页面，这些选项无法生效
+        unsupported = [name for name, used in (('--scale', args.scale and args.scale != [1]),
+                                               ('--cache-dir', args.cache_dir),
+                                               ('repeated --template', len(args.template or []) > 1)) if used]
+        if unsupported:
+            parser.error(f"--stream cannot be combined with {', '.join(unsupported)}")
+    check_container_arguments(parser, args)
+    setup_logging(args)
+
+    def run(out):
+        report = [] if args.encode_report else None
+        templates = args.template or [None]
+        if len(templates) > 1:
+            generate_cards_multi(args.input, args.output, templates, args.marker, jobs=args.jobs,
+                                 output=output_overrides(args), encode_threads=args.encode_threads, report=report,
+                                 cache_dir=args.cache_dir, cache_bytes=args.cache_size * 1024 * 1024, scales=args.scale,
+                                 container=args.container)
+        elif args.stream:
+            from .stream import generate_cards_streaming
+            generate_cards_streaming(args.input, args.output, templates[0], args.marker, jobs=args.jobs,
+                                     output=output_overrides(args), encode_threads=args.encode_threads, report=report,
+                                     container=args.container)
+        else:
+            generate_cards(args.input, args.output, templates[0], args.max_chars, args.marker, jobs=args.jobs,
+                           output=output_overrides(args), encode_threads=args.encode_threads, report=report,
+                           cache_dir=args.cache_dir, cache_bytes=args.cache_size * 1024 * 1024, scales=args.scale,
+                           container=args.container)
+        if report is not None:
+            print(format_report(report), file=out)
+    run_with_stats(args, run)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,169 @@
+import hashlib
+import json
+import os
+import tempfile
+from collections import namedtuple
+from .cache import file_identity
+from .fonts import BOLD_FONT_PATHS, FONT_REGISTRY
+from .layout import STYLE_MAP
+from .metrics import font_metrics, seed_metrics
+from . import stats
+from .stats import logger
+
+# 模板编译缓存目录，可用环境变量 MD2CARD_TEMPLATE_CACHE 修改，设为空字符串则不写磁盘
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'md2card', 'templates')
+
+# 格式变化时递增，旧缓存自动失效
+CACHE_VERSION = 3
+
+# 模板中需要预先解析的样式
+STYLES = {
+    'h1': STYLE_MAP['heading'][1],
+    'h2': STYLE_MAP['heading'][2],
+    'h3': STYLE_MAP['heading'][3],
+    'h4': STYLE_MAP['heading'][4],
+    'h5': STYLE_MAP['heading'][5],
+    'h6': STYLE_MAP['heading'][6],
+    'paragraph': STYLE_MAP['paragraph'],
+    'strong': dict(STYLE_MAP['paragraph'], bold=True, font_color='#000000'),
+    'emphasis': dict(STYLE_MAP['paragraph'], italic=True),
+    'list': STYLE_MAP['list'],
+    'blockquote': STYLE_MAP['blockquote'],
+    'code': {'font_size': 28, 'font_color': '#333333'},
+    'table': {'font_size': 32},
+    'nav': {'font_size': 38, 'font_color': '#FFD60A'},
+}
+
+# spec 为 (path, size, index)；度量单位为像素
+CompiledStyle = namedtuple('CompiledStyle', 'spec fake_bold color line_height ascent descent space_width')
+
+
+class CompiledTemplate:
+    """模板编译结果：每个样式对应的字体、模拟粗体标记、颜色和行高等度量。"""
+
+    def __init__(self, styles, resolved):
+        self.styles = styles
+        # (font_path, bold, italic) -> (path, index, simulated)，用于预填 FONT_REGISTRY
+        self.resolved = resolved
+        # (size, bold, italic) -> (spec, fake_bold)，排版时按样式直接查表
+        self.specs = {}
+        for name, style in styles.items():
+            source = STYLES[name]
+            key = (style.spec[1], source.get('bold', False), source.get('italic', False))
+            self.specs[key] = (style.spec, style.fake_bold)
+
+    def style(self, name):
+        return self.styles[name]
+
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _compile(template):
+    styles = {}
+    resolved = {}
+    for name, style in STYLES.items():
+        size = style.get('font_size', template.font_size)
+        bold = style.get('bold', False)
+        italic = style.get('italic', False)
+        path, index, fake_bold = FONT_REGISTRY.resolve(template.font_path, size, bold, italic)
+        resolved[(template.font_path, bold, italic)] = (path, index, fake_bold)
+        spec = (path, size, index)
+        metrics = font_metrics(spec)
+        styles[name] = CompiledStyle(spec, fake_bold, style.get('font_color', template.font_color),
+                                     metrics.line_height, metrics.ascent, metrics.descent, metrics.advance(' '))
+    return CompiledTemplate(styles, resolved)
+
+
+def _cache_path(template, cache_dir):
+    key = json.dumps({'version': CACHE_VERSION, 'config': template.config}, sort_keys=True, ensure_ascii=False)
+    return os.path.join(cache_dir, hashlib.sha256(key.encode('utf-8')).hexdigest() + '.json')
+
+
+def _probes(template):
+    # 粗体解析依赖哪些候选字体文件存在，连同模板字体一起记录，换了机器或装了字体就重新编译
+    return {path: list(file_identity(path)[1:]) for path in [template.font_path] + BOLD_FONT_PATHS}
+
+
+def _files_valid(files):
+    # 大小和修改时间没变就认为字体没变；变了再比较内容哈希
+    for path, (size, mtime_ns, digest) in files.items():
+        try:
+            if file_identity(path)[1:] == (size, mtime_ns):
+                continue
+            if file_hash(path) != digest:
+                return False
+        except OSError:
+            return False
+    return True
+
+
+def _load(path, template):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # 缓存文件内容不完整或格式不对时当作未命中，重新编译
+    try:
+        if data.get('version') != CACHE_VERSION or data.get('probes') != _probes(template):
+            return None
+        if not _files_valid(data.get('files', {})):
+            return None
+        styles = {name: CompiledStyle(tuple(s['spec']), s['fake_bold'], s['color'], s['line_height'],
+                                      s['ascent'], s['descent'], s['space_width'])
+                  for name, s in data['styles'].items()}
+        resolved = {(r[0], r[1], r[2]): (r[3], r[4], r[5]) for r in data['resolved']}
+        return CompiledTemplate(styles, resolved)
+    except (AttributeError, KeyError, TypeError, ValueError, IndexError):
+        logger.debug("模板编译缓存损坏，重新编译: %s", path)
+        return None
+
+
+def _save(path, compiled, template):
+    paths = {style.spec[0] for style in compiled.styles.values()}
+    data = {
+        'version': CACHE_VERSION,
+        'probes': _probes(template),
+        'files': {p: list(file_identity(p)[1:]) + [file_hash(p)] for p in sorted(paths) if os.path.isfile(p)},
+        'styles': {name: dict(s._asdict(), spec=list(s.spec)) for name, s in compiled.styles.items()},
+        'resolved': [list(k) + list(v) for k, v in compiled.resolved.items()],
+    }
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # 先写临时文件再替换，多个进程同时编译同一模板也不会读到半个文件
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def compile_template(template, cache_dir=None):
+    """解析模板的所有样式；结果按模板 JSON 缓存到磁盘，
+    并用解析出的字体文件哈希和粗体候选字体是否存在校验。
+
+    命中磁盘缓存时不再探测粗体字体文件，也不需要为了度量打开字体。
+    """
+    if cache_dir is None:
+        cache_dir = os.environ.get('MD2CARD_TEMPLATE_CACHE', DEFAULT_CACHE_DIR)
+    path = _cache_path(template, cache_dir) if cache_dir else None
+    compiled = _load(path, template) if path else None
+    if compiled is not None:
+        stats.count('template_cache_hits')
+    else:
+        compiled = _compile(template)
+        if path:
+            try:
+                _save(path, compiled, template)
+            except OSError as e:
+                logger.debug("模板编译缓存写入失败: %s", e)
+    for (font_path, bold, italic), resolved in compiled.resolved.items():
+        FONT_REGISTRY.seed(font_path, bold, italic, resolved)
+    # 排版用的 ascent/descent/空格宽度直接取编译结果，不为此打开字体
+    for style in compiled.styles.values():
+        seed_metrics(style.spec, style.ascent, style.descent, style.space_width)
+    return compiled
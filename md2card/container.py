@@ -0,0 +1,304 @@
+import contextvars
+import hashlib
+import io
+import json
+import os
+import tarfile
+import time
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from PIL import TiffImagePlugin
+from .encode import OutputOptions
+from .markdown_render import rasterize_items, rasterize_page, _worker_template, create_render_pool, resolve_jobs
+from . import stats
+from .stats import logger
+
+# 容器格式 -> 文件扩展名
+CONTAINERS = {
+    'pdf': 'pdf',
+    'webp': 'webp',
+    'tiff': 'tiff',
+    'zip': 'zip',
+    'tar': 'tar',
+}
+
+# 多帧 WebP 每帧的显示时长（毫秒）
+FRAME_DURATION_MS = 3000
+
+
+def container_filename(name, kind, scale=1):
+    suffix = '' if scale == 1 else f'@{scale:g}x'
+    return f'{name}{suffix}.{CONTAINERS[kind]}'
+
+
+def encode_frame(kind, options, img):
+    """把一页编码成容器需要的数据，返回 (bytes, 编码耗时毫秒)。
+
+    pdf：JPEG 输出时嵌入 JPEG，否则嵌入 zlib 压缩的 RGB 像素；webp：单帧 WebP；
+    tiff：单页 deflate 压缩的 TIFF；zip/tar：按输出格式编码的页面文件。
+    """
+    started = time.perf_counter()
+    if kind == 'pdf':
+        if options.format in ('jpeg', 'jpg'):
+            data = options.encode(img)
+        else:
+            level = options.compress_level if options.compress_level is not None else 6
+            data = zlib.compress(img.convert('RGB').tobytes(), level)
+    elif kind == 'webp':
+        data = OutputOptions.from_config(options.to_config(), format='webp').encode(img)
+    elif kind == 'tiff':
+        buf = io.BytesIO()
+        img.save(buf, format='TIFF', compression='tiff_adobe_deflate')
+        data = buf.getvalue()
+    else:
+        data = options.encode(img)
+    return data, (time.perf_counter() - started) * 1000
+
+
+class PdfWriter:
+    """逐页追加的 PDF：每页一个图片对象，页面树和交叉引用表在 close 时写在文件末尾。
+
+    按 72 dpi 换算，一个像素对应一个点。
+    """
+
+    def __init__(self, fp, options):
+        self.fp = fp
+        self.jpeg = options.format in ('jpeg', 'jpg')
+        # 对象 1 为 Catalog，对象 2 为页面树，最后写
+        self.offsets = {}
+        self.pages = []
+        self.next_id = 3
+        fp.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    def _object(self, body, stream=None, obj_id=None):
+        if obj_id is None:
+            obj_id = self.next_id
+            self.next_id += 1
+        self.offsets[obj_id] = self.fp.tell()
+        self.fp.write(f'{obj_id} 0 obj\n'.encode('ascii') + body)
+        if stream is not None:
+            self.fp.write(b'\nstream\n' + stream + b'\nendstream')
+        self.fp.write(b'\nendobj\n')
+        return obj_id
+
+    def add(self, data, width, height, name=None):
+        filter_name = 'DCTDecode' if self.jpeg else 'FlateDecode'
+        image = self._object(
+            f'<< /Type /XObject /Subtype /Image /Width {width} /Height {height} /ColorSpace /DeviceRGB '
+            f'/BitsPerComponent 8 /Filter /{filter_name} /Length {len(data)} >>'.encode('ascii'), data)
+        content = f'q {width} 0 0 {height} 0 0 cm /Im0 Do Q'.encode('ascii')
+        contents = self._object(f'<< /Length {len(content)} >>'.encode('ascii'), content)
+        page = self._object(
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width} {height}] '
+            f'/Resources << /XObject << /Im0 {image} 0 R >> >> /Contents {contents} 0 R >>'.encode('ascii'))
+        self.pages.append(page)
+
+    def close(self):
+        kids = ' '.join(f'{page} 0 R' for page in self.pages)
+        self._object(f'<< /Type /Pages /Kids [{kids}] /Count {len(self.pages)} >>'.encode('ascii'), obj_id=2)
+        self._object(b'<< /Type /Catalog /Pages 2 0 R >>', obj_id=1)
+        xref = self.fp.tell()
+        lines = [f'xref\n0 {self.next_id}\n', '0000000000 65535 f \n']
+        lines.extend(f'{self.offsets[i]:010d} 00000 n \n' for i in range(1, self.next_id))
+        lines.append(f'trailer\n<< /Size {self.next_id} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n')
+        self.fp.write(''.join(lines).encode('ascii'))
+
+
+def _chunk(fourcc, payload):
+    # RIFF 数据块，奇数长度补一个字节
+    return fourcc + len(payload).to_bytes(4, 'little') + payload + (b'\0' if len(payload) & 1 else b'')
+
+
+def _webp_frame_data(data):
+    # 单帧 WebP 去掉 RIFF 头，只保留 ALPH/VP8/VP8L 数据块
+    pos = 12
+    chunks = []
+    while pos + 8 <= len(data):
+        fourcc = data[pos:pos + 4]
+        size = int.from_bytes(data[pos + 4:pos + 8], 'little')
+        end = pos + 8 + size + (size & 1)
+        if fourcc in (b'ALPH', b'VP8 ', b'VP8L'):
+            chunks.append(data[pos:end])
+        pos = end
+    return b''.join(chunks)
+
+
+class WebPWriter:
+    """逐帧追加的多帧 WebP：每帧编码好后直接写成 ANMF 块，close 时回填 RIFF 总长度。"""
+
+    def __init__(self, fp, duration=FRAME_DURATION_MS):
+        self.fp = fp
+        self.duration = duration
+        self.started = False
+
+    def add(self, data, width, height, name=None):
+        if not self.started:
+            size = (width - 1).to_bytes(3, 'little') + (height - 1).to_bytes(3, 'little')
+            self.fp.write(b'RIFF\0\0\0\0WEBP')
+            # VP8X 标记为动画；ANIM 为白色背景、无限循环
+            self.fp.write(_chunk(b'VP8X', b'\x02\0\0\0' + size))
+            self.fp.write(_chunk(b'ANIM', b'\xff\xff\xff\xff\0\0'))
+            self.started = True
+        header = (b'\0' * 6 + (width - 1).to_bytes(3, 'little') + (height - 1).to_bytes(3, 'little')
+                  + self.duration.to_bytes(3, 'little') + b'\x02')
+        self.fp.write(_chunk(b'ANMF', header + _webp_frame_data(data)))
+
+    def close(self):
+        if not self.started:
+            return
+        end = self.fp.tell()
+        self.fp.seek(4)
+        self.fp.write((end - 8).to_bytes(4, 'little'))
+        self.fp.seek(end)
+
+
+class TiffWriter:
+    # 多页 TIFF：单页 TIFF 依次写入 AppendingTiffWriter，由它修正各页的偏移
+    def __init__(self, fp):
+        self.writer = TiffImagePlugin.AppendingTiffWriter(fp)
+
+    def add(self, data, width, height, name=None):
+        self.writer.write(data)
+        self.writer.newFrame()
+
+    def close(self):
+        self.writer.close()
+
+
+class ArchiveWriter:
+    """zip 或 tar 归档：页面文件依次写入，最后写 manifest.json（文件名、尺寸、字节数、sha256）。
+
+    tar 使用流式模式，不会回头修改已写的内容。
+    """
+
+    def __init__(self, fp, kind, options):
+        self.kind = kind
+        self.options = options
+        self.entries = []
+        if kind == 'zip':
+            # 图片已经压缩过，zip 里直接存储
+            self.archive = zipfile.ZipFile(fp, 'w', zipfile.ZIP_STORED)
+        else:
+            self.archive = tarfile.open(fileobj=fp, mode='w|')
+
+    def _write(self, name, data):
+        if self.kind == 'zip':
+            self.archive.writestr(name, data)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            self.archive.addfile(info, io.BytesIO(data))
+
+    def add(self, data, width, height, name=None):
+        self._write(name, data)
+        self.entries.append({'name': name, 'width': width, 'height': height, 'bytes': len(data),
+                             'sha256': hashlib.sha256(data).hexdigest()})
+
+    def close(self):
+        manifest = {'format': self.options.format, 'pages': self.entries}
+        self._write('manifest.json', json.dumps(manifest, ensure_ascii=False, indent=2).encode('utf-8'))
+        self.archive.close()
+
+
+def open_container(kind, fp, options):
+    if kind == 'pdf':
+        return PdfWriter(fp, options)
+    if kind == 'webp':
+        return WebPWriter(fp)
+    if kind == 'tiff':
+        return TiffWriter(fp)
+    if kind in ('zip', 'tar'):
+        return ArchiveWriter(fp, kind, options)
+    raise ValueError(f"不支持的容器格式: {kind}")
+
+
+def _encode_task(kind, options, img, page):
+    data, encode_ms = encode_frame(kind, options, img)
+    stats.add_time('encode', encode_ms / 1000, page)
+    return data, img.width, img.height, encode_ms
+
+
+def _container_worker_task(task):
+    config, items, kind, output, page, scale, collect = task
+
+    def run():
+        with stats.stage('raster', page):
+            img = rasterize_items(items, _worker_template(config), scale)
+        return _encode_task(kind, OutputOptions.from_config(output), img, page)
+    if not collect:
+        return run()
+    with stats.collect_stats() as collected:
+        result = run()
+    return result + (collected.snapshot(),)
+
+
+def write_container(pages, template, path, kind, options=None, jobs=1, pool=None, encode_threads=2,
+                    scale=1, report=None):
+    """把页面按顺序追加到一个容器文件里，返回页数。
+
+    pages 可以是生成器：最多 2*并行数 页在途，写完即释放，内存占用与页数无关。
+    """
+    options = options or OutputOptions.from_config(template.output)
+    workers = resolve_jobs(jobs)
+    own_pool = pool is None and workers > 1
+    if own_pool:
+        pool = create_render_pool(template, workers)
+    executor = None if pool is not None else ThreadPoolExecutor(max_workers=max(1, encode_threads))
+    limit = 2 * (workers if pool is not None else max(1, encode_threads))
+    collect = stats.enabled()
+    pending = deque()
+    count = 0
+    try:
+        with open(path, 'w+b') as f:
+            writer = open_container(kind, f, options)
+
+            def finish():
+                index, future = pending.popleft()
+                data, width, height, encode_ms, *snapshot = future.result()
+                if snapshot:
+                    stats.merge(snapshot[0])
+                writer.add(data, width, height, options.filename(index, scale))
+                if report is not None:
+                    report.append({'path': f'{path}[{index}]', 'bytes': len(data), 'encode_ms': encode_ms,
+                                   'page': index, 'scale': scale})
+
+            for index, page in enumerate(pages, 1):
+                if pool is not None:
+                    task = (template.config, page.items, kind, options.to_config(), index, scale, collect)
+                    future = pool.submit(_container_worker_task, task)
+                else:
+                    with stats.stage('raster', index):
+                        img = rasterize_page(page, template, scale)
+                    future = executor.submit(contextvars.copy_context().run, _encode_task, kind, options, img, index)
+                    del img
+                pending.append((index, future))
+                count = index
+                while len(pending) >= limit:
+                    finish()
+            while pending:
+                finish()
+            writer.close()
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if own_pool:
+            pool.shutdown()
+    logger.info("已写入 %s（%d 页）", path, count)
+    return count
+
+
+def write_containers(pages, template, output_dir, name, kind, options=None, jobs=1, pool=None, encode_threads=2,
+                     scales=None, report=None):
+    # 每个缩放比例一个容器文件，返回文件路径列表
+    scales = scales or [1]
+    if len(scales) > 1:
+        pages = list(pages)
+    paths = []
+    for scale in scales:
+        path = os.path.join(output_dir, container_filename(name, kind, scale))
+        write_container(pages, template, path, kind, options, jobs, pool, encode_threads, scale, report)
+        paths.append(path)
+    return paths
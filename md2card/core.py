@@ -11,19 +11,24 @@ def extract_all_text(node):
     else:
         return str(node)
 
-import mistune
-from PIL import Image, ImageDraw
+import json
+import os
+import time
 from .templates import Template
 from .utils import load_text
-from .markdown_render import render_markdown_to_image, render_markdown_to_images
+from .markdown_render import render_markdown_to_image, render_pages, create_render_pool, resolve_jobs, rasterize_page
+from .container import write_containers
+from .layout import layout_pages
+from .encode import OutputOptions
+from .cache import RenderCache, DEFAULT_CACHE_BYTES
+from .parser import parse, split_pages
+from . import stats
+from .stats import logger
 
 def paginate_markdown_blocks(md_text, max_chars, marker='[[PAGE_BREAK]]'):
     # 先按 marker 分段
-    segments = md_text.split(marker)
     pages = []
-    for seg in segments:
-        md = mistune.create_markdown(renderer='ast')
-        ast = md(seg)
+    for ast in split_pages(parse(md_text, marker)):
         current_blocks = []
         current_len = 0
         for block in ast:
@@ -60,69 +65,243 @@ def paginate_markdown_blocks(md_text, max_chars, marker='[[PAGE_BREAK]]'):
 def render_page(text, template, output_path):
     render_markdown_to_image(text, template, output_path)
 
-def generate_cards(input_path, output_dir, template_path=None, max_chars=1000, marker='[[PAGE_BREAK]]'):
-    import os
+def load_template(template_path=None):
+    with stats.stage('load'):
+        return Template.from_json(template_path) if template_path else Template.from_json('default_template.json')
+
+def parse_document(text, marker='[[PAGE_BREAK]]'):
+    with stats.stage('parse'):
+        return _parse_document(text, marker)
+
+def _parse_document(text, marker):
+    # 整篇只解析一次，按 page_break 节点切分为手动分页区域；没有分页标记时只有一个
+    asts = split_pages(parse(text, marker))
+    if len(asts) > 1:
+        logger.info("检测到手动分页标记，分为 %d 个区域", len(asts))
+    return asts
+
+def layout_document(text, tpl, marker='[[PAGE_BREAK]]'):
+    return layout_asts(parse_document(text, marker), tpl)
+
+def layout_asts(asts, tpl):
+    all_pages = []
+    for i, ast in enumerate(asts, 1):
+        # 每个块排版一次，分页和绘制共用排版结果；区域内容过长时再按高度分页
+        sub_pages = layout_pages(ast, tpl)
+        all_pages.extend(sub_pages)
+        if len(asts) > 1:
+            logger.info("区域 %d 分为 %d 页", i, len(sub_pages))
+    return all_pages
+
+def output_options(tpl, output=None):
+    # 命令行/调用方给出的编码参数覆盖模板中的 "output"
+    return OutputOptions.from_config(tpl.output, **(output or {}))
+
+def open_cache(cache_dir=None, cache_bytes=None):
+    # 未指定 cache_dir 时不启用渲染缓存
+    if not cache_dir:
+        return None
+    return RenderCache(cache_dir, DEFAULT_CACHE_BYTES if cache_bytes is None else cache_bytes)
+
+def render_output(pages, tpl, output_dir, input_path, jobs=1, pool=None, options=None, encode_threads=2,
+                  report=None, cache=None, scales=None, container=None):
+    # 默认每页一个文件；指定 container 时所有页按顺序写进一个以输入文件名命名的容器文件
+    if container:
+        name = os.path.splitext(os.path.basename(input_path))[0] if input_path else 'cards'
+        return write_containers(pages, tpl, output_dir, name, container, options, jobs, pool,
+                                encode_threads, scales, report)
+    return render_pages(pages, tpl, output_dir, jobs, pool=pool, options=options, encode_threads=encode_threads,
+                        report=report, cache=cache, scales=scales)
+
+def generate_cards(input_path, output_dir, template_path=None, max_chars=1000, marker='[[PAGE_BREAK]]', jobs=1,
+                   output=None, encode_threads=2, report=None, cache_dir=None, cache_bytes=None, scales=None,
+                   container=None):
     os.makedirs(output_dir, exist_ok=True)
-    text = load_text(input_path)
-    print('DEBUG: Text after load_text, before any processing:')
-    print(repr(text[:500]))
-    tpl = Template.from_json(template_path) if template_path else Template.from_json('default_template.json')
-    
-    # 先按 marker 分段
-    segments = text.split(marker)
+    with stats.stage('load'):
+        text = load_text(input_path)
+    logger.debug('Text after load_text, before any processing: %r', text[:500])
+    tpl = load_template(template_path)
     
-    # 如果只有一页，按高度自动分页
-    if len(segments) == 1:
-        render_markdown_to_images(text, tpl, output_dir)
-    else:
-        # 有手动分页标记，按标记分页处理
-        print(f"检测到手动分页标记，分为 {len(segments)} 个区域")
-        page_counter = 1  # 页面计数器
-        
-        for i, segment in enumerate(segments, 1):
-            if segment.strip():  # 忽略空段落
-                # 对每个区域进行高度测量和自动分页
-                md = mistune.create_markdown(renderer='ast')
-                ast = md(segment)
-                
-                # 测量AST树高度，分页
-                width, height = tpl.width, tpl.height
-                x = tpl.margins['left']
-                y = tpl.margins['top']
-                nav_height = 100
-                y_start = nav_height + 30
-                max_y = height - tpl.margins['bottom']
-                
-                # 临时画布用于测量
-                from PIL import Image, ImageDraw
-                temp_img = Image.new('RGB', (width, height), tpl.background_color)
-                temp_draw = ImageDraw.Draw(temp_img)
-                
-                # 导入测量函数
-                from .markdown_render import measure_node
-                
-                # 分页
-                sub_pages = []
-                current_page = []
-                current_y = y_start
-                
-                for node in ast:
-                    node_height = measure_node(node, x, current_y, temp_draw, tpl)
-                    if current_y + node_height > max_y and current_page:
-                        sub_pages.append(current_page)
-                        current_page = []
-                        current_y = y_start
-                    current_page.append(node)
-                    current_y += node_height
-                
-                if current_page:
-                    sub_pages.append(current_page)
-                
-                # 渲染子页面
-                for sub_page in sub_pages:
-                    out_path = os.path.join(output_dir, f'page_{page_counter:02d}.png')
-                    from .markdown_render import render_ast_page
-                    render_ast_page(sub_page, tpl, out_path)
-                    page_counter += 1
-                
-                print(f"区域 {i} 分为 {len(sub_pages)} 页")
+    # 所有区域排版完成后统一渲染，页码连续
+    pages = layout_document(text, tpl, marker)
+    return render_output(pages, tpl, output_dir, input_path, jobs, options=output_options(tpl, output),
+                         encode_threads=encode_threads, report=report, cache=open_cache(cache_dir, cache_bytes),
+                         scales=scales, container=container)
+
+# 只影响绘制、不影响排版和分页的模板字段
+RENDER_ONLY_FIELDS = ('background_color', 'background_image', 'font_color', 'output')
+
+def layout_key(tpl):
+    # 其余字段（尺寸、边距、字体、字号、行距、断行方式）相同的模板共用一次排版；
+    # 文字颜色在绘制时才确定（见 TextItem），不影响排版
+    return json.dumps({k: v for k, v in tpl.config.items() if k not in RENDER_ONLY_FIELDS},
+                      sort_keys=True, ensure_ascii=False)
+
+def template_dirnames(template_paths):
+    # 每个模板输出到以模板文件名命名的子目录，重名时加序号
+    names = []
+    for path in template_paths:
+        base = os.path.splitext(os.path.basename(path))[0] if path else 'default'
+        name = base
+        n = 2
+        while name in names:
+            name = f'{base}_{n}'
+            n += 1
+        names.append(name)
+    return names
+
+def generate_cards_multi(input_path, output_root, template_paths, marker='[[PAGE_BREAK]]', jobs=1, output=None,
+                         encode_threads=2, report=None, cache_dir=None, cache_bytes=None, scales=None,
+                         container=None):
+    """同一篇文章按多个模板输出：只解析一次，排版相关字段相同的模板共用一次排版和分页。
+
+    返回 {子目录名: [图片路径]}。
+    """
+    with stats.stage('load'):
+        text = load_text(input_path)
+    asts = parse_document(text, marker)
+    templates = [load_template(path) for path in template_paths]
+    groups = {}
+    for tpl in templates:
+        groups.setdefault(layout_key(tpl), []).append(tpl)
+    logger.info("%d 个模板，%d 组排版", len(templates), len(groups))
+    layouts = {key: layout_asts(asts, members[0]) for key, members in groups.items()}
+    cache = open_cache(cache_dir, cache_bytes)
+    pool = create_render_pool(templates[0], jobs) if resolve_jobs(jobs) > 1 else None
+    results = {}
+    try:
+        for name, tpl in zip(template_dirnames(template_paths), templates):
+            output_dir = os.path.join(output_root, name)
+            os.makedirs(output_dir, exist_ok=True)
+            results[name] = render_output(layouts[layout_key(tpl)], tpl, output_dir, input_path, jobs, pool=pool,
+                                          options=output_options(tpl, output), encode_threads=encode_threads,
+                                          report=report, cache=cache, scales=scales, container=container)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return results
+
+class Card:
+    # 内存中的一张卡片：页码、PIL 图片、排版信息，可选的编码后字节
+    def __init__(self, index, image, page, data=None, format=None):
+        self.index = index
+        self.image = image
+        self.page = page
+        self.data = data
+        self.format = format
+
+    @property
+    def filename(self):
+        ext = (self.format or 'png').lower()
+        return f'page_{self.index:02d}.{ext}'
+
+    def encode(self, format='PNG', **params):
+        import io
+        buf = io.BytesIO()
+        self.image.save(buf, format=format, **params)
+        return buf.getvalue()
+
+def iter_cards(md_text, template=None, marker='[[PAGE_BREAK]]', encode=None, **encode_params):
+    # 逐页生成卡片，每页绘制完成就立即返回，不经过文件系统
+    # encode 可以是格式名（'png'/'webp'/'jpeg'，其余参数同 OutputOptions）或 OutputOptions
+    tpl = template if isinstance(template, Template) else load_template(template)
+    options = encode
+    if isinstance(encode, str):
+        options = OutputOptions(format=encode, **encode_params)
+    pages = layout_document(md_text, tpl, marker)
+    for index, page in enumerate(pages, 1):
+        with stats.stage('raster', index):
+            card = Card(index, rasterize_page(page, tpl), page)
+        if options:
+            with stats.stage('encode', index):
+                card.data = options.encode(card.image)
+            card.format = options.extension
+        yield card
+
+def iter_batch_inputs(source, output_root):
+    # 目录：处理其中所有 .md/.markdown/.txt 文件；清单：每行一个 JSON 对象
+    # {"input": "a.md", "output": "out/a", "template": "tpl.json"}，相对路径以清单所在目录为准；
+    # 无法解析的行产出带 error 的记录，不中断整个批次
+    if os.path.isdir(source):
+        for root, _, files in os.walk(source):
+            for name in sorted(files):
+                if os.path.splitext(name)[1].lower() in ('.md', '.markdown', '.txt'):
+                    path = os.path.join(root, name)
+                    rel = os.path.splitext(os.path.relpath(path, source))[0]
+                    yield {'input': path, 'output': os.path.join(output_root, rel)}
+        return
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source, 'r', encoding='utf-8') as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+                path = os.path.join(base, entry['input'])
+                job = {'input': path}
+                if entry.get('output'):
+                    job['output'] = os.path.join(base, entry['output'])
+                else:
+                    job['output'] = os.path.join(output_root, os.path.splitext(os.path.basename(path))[0])
+                if entry.get('template'):
+                    job['template'] = os.path.join(base, entry['template'])
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                yield {'input': f'{source}:{lineno}', 'output': '', 'error': f'清单第 {lineno} 行无效: {e!r}'}
+                continue
+            yield job
+
+def generate_cards_batch(source, output_root='cards', template_path=None, marker='[[PAGE_BREAK]]', jobs=1,
+                         output=None, encode_threads=2, cache_dir=None, cache_bytes=None, scales=None,
+                         container=None):
+    # 在同一个进程里处理多篇文档，模板、字体缓存、图标缓存和进程池都只创建一次
+    started = time.perf_counter()
+    templates = {}
+    results = []
+    pool = None
+    cache = open_cache(cache_dir, cache_bytes)
+    try:
+        for job in iter_batch_inputs(source, output_root):
+            doc_started = time.perf_counter()
+            if 'error' in job:
+                results.append(dict(job, pages=0, seconds=0.0))
+                logger.warning("%s", job['error'])
+                continue
+            try:
+                tpl_path = job.get('template', template_path)
+                tpl = templates.get(tpl_path)
+                if tpl is None:
+                    tpl = templates[tpl_path] = load_template(tpl_path)
+                if pool is None and resolve_jobs(jobs) > 1:
+                    pool = create_render_pool(tpl, jobs)
+                with stats.stage('load'):
+                    text = load_text(job['input'])
+                pages = layout_document(text, tpl, marker)
+                os.makedirs(job['output'], exist_ok=True)
+                paths = render_output(pages, tpl, job['output'], job['input'], jobs, pool=pool,
+                                      options=output_options(tpl, output), encode_threads=encode_threads,
+                                      cache=cache, scales=scales, container=container)
+                results.append({'input': job['input'], 'output': job['output'],
+                                'pages': len(pages), 'files': len(paths),
+                                'seconds': time.perf_counter() - doc_started})
+            except Exception as e:
+                # 单篇失败不影响整个批次
+                results.append({'input': job['input'], 'output': job['output'], 'pages': 0,
+                                'seconds': time.perf_counter() - doc_started, 'error': repr(e)})
+                logger.warning("处理失败 %s: %r", job['input'], e)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    elapsed = time.perf_counter() - started
+    ok = [r for r in results if 'error' not in r]
+    pages = sum(r['pages'] for r in ok)
+    return {
+        'documents': len(results),
+        'succeeded': len(ok),
+        'failed': len(results) - len(ok),
+        'pages': pages,
+        'seconds': elapsed,
+        'documents_per_second': len(ok) / elapsed if elapsed else 0.0,
+        'pages_per_second': pages / elapsed if elapsed else 0.0,
+        'results': results,
+    }
@@ -0,0 +1,154 @@
+import contextvars
+import io
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from . import stats
+
+# format -> (PIL 格式名, 文件扩展名)
+FORMATS = {
+    'png': ('PNG', 'png'),
+    'webp': ('WEBP', 'webp'),
+    'jpeg': ('JPEG', 'jpg'),
+    'jpg': ('JPEG', 'jpg'),
+}
+
+
+class OutputOptions:
+    # 输出编码参数，可来自模板的 "output" 字段或命令行
+    def __init__(self, format='png', compress_level=None, optimize=False, quality=None,
+                 lossless=False, palette=0, method=None):
+        format = format.lower()
+        if format not in FORMATS:
+            raise ValueError(f"不支持的输出格式: {format}")
+        self.format = format
+        self.compress_level = compress_level
+        self.optimize = optimize
+        self.quality = quality
+        self.lossless = lossless
+        # 调色板颜色数，0 表示不量化；纯色为主的卡片用 64~256 色通常肉眼无差别
+        self.palette = palette
+        self.method = method
+
+    @classmethod
+    def from_config(cls, config=None, **overrides):
+        merged = dict(config or {})
+        merged.update({k: v for k, v in overrides.items() if v is not None})
+        return cls(**merged)
+
+    def to_config(self):
+        return {
+            'format': self.format,
+            'compress_level': self.compress_level,
+            'optimize': self.optimize,
+            'quality': self.quality,
+            'lossless': self.lossless,
+            'palette': self.palette,
+            'method': self.method,
+        }
+
+    @property
+    def pil_format(self):
+        return FORMATS[self.format][0]
+
+    @property
+    def extension(self):
+        return FORMATS[self.format][1]
+
+    def filename(self, index, scale=1):
+        # 非 1 倍的输出加 @2x 之类的后缀
+        suffix = '' if scale == 1 else f'@{scale:g}x'
+        return f'page_{index:02d}{suffix}.{self.extension}'
+
+    def save_params(self):
+        params = {}
+        if self.format == 'png':
+            if self.compress_level is not None:
+                params['compress_level'] = self.compress_level
+            if self.optimize:
+                params['optimize'] = True
+        elif self.format == 'webp':
+            params['lossless'] = bool(self.lossless)
+            if self.quality is not None:
+                params['quality'] = self.quality
+            if self.method is not None:
+                params['method'] = self.method
+        else:
+            if self.quality is not None:
+                params['quality'] = self.quality
+            if self.optimize:
+                params['optimize'] = True
+        return params
+
+    def prepare(self, img):
+        # 调色板只对 PNG 有意义，JPEG/WebP 会再转回真彩色
+        if self.palette and self.format == 'png':
+            return img.quantize(colors=self.palette, method=2)  # 2 = FASTOCTREE
+        return img
+
+    def encode(self, img):
+        buf = io.BytesIO()
+        self.prepare(img).save(buf, format=self.pil_format, **self.save_params())
+        return buf.getvalue()
+
+
+def encode_to_file(img, path, options, page=None):
+    # 编码并写入文件，返回该页的字节数和编码耗时
+    started = time.perf_counter()
+    data = options.encode(img)
+    elapsed = time.perf_counter() - started
+    encode_ms = elapsed * 1000
+    stats.add_time('encode', elapsed, page)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return {'path': path, 'bytes': len(data), 'encode_ms': encode_ms}
+
+
+class EncodePool:
+    # 在线程池中编码（PIL 编码时释放 GIL），和下一页的绘制重叠；
+    # 最多积压 2*threads 张未编码的图片，避免内存随页数增长
+    def __init__(self, options, threads=2):
+        self.options = options
+        self.threads = max(1, threads)
+        self._executor = ThreadPoolExecutor(max_workers=self.threads) if threads > 0 else None
+        self._pending = deque()
+        self._done = []
+
+    def submit(self, img, path, page=None):
+        if self._executor is None:
+            self._done.append(encode_to_file(img, path, self.options, page))
+            return
+        while len(self._pending) >= 2 * self.threads:
+            self._done.append(self._pending.popleft().result())
+        # 在提交者的上下文中运行，编码耗时计入提交线程的统计
+        context = contextvars.copy_context()
+        self._pending.append(self._executor.submit(context.run, encode_to_file, img, path, self.options, page))
+
+    def results(self):
+        while self._pending:
+            self._done.append(self._pending.popleft().result())
+        return self._done
+
+    def close(self):
+        self.results()
+        if self._executor is not None:
+            self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def format_report(entries):
+    lines = []
+    total_bytes = 0
+    total_ms = 0.0
+    for e in entries:
+        lines.append(f"{os.path.basename(e['path'])}: {e['bytes'] / 1024:.1f} KB, {e['encode_ms']:.1f} ms")
+        total_bytes += e['bytes']
+        total_ms += e['encode_ms']
+    lines.append(f"total: {len(entries)} pages, {total_bytes / 1024:.1f} KB, {total_ms:.1f} ms encode")
+    return '\n'.join(lines)
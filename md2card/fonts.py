@@ -0,0 +1,139 @@
+import os
+import threading
+from collections import OrderedDict, Counter
+from PIL import ImageFont
+from . import stats
+from .stats import logger
+
+# 常见系统字体路径
+BOLD_FONT_PATHS = [
+    "/System/Library/Fonts/PingFang.ttc",  # macOS
+    "/System/Library/Fonts/STHeiti Medium.ttc",  # macOS 备选
+    "/System/Library/Fonts/Microsoft/SimHei.ttf",  # Windows
+    "/usr/share/fonts/truetype/noto/NotoSansCJK-Bold.ttc",  # Linux
+]
+
+
+class FontRegistry:
+    """进程级字体缓存：(path, size, index) -> FreeTypeFont，LRU 淘汰。
+
+    粗体/斜体的回退链按模板字体路径只解析一次，之后直接命中缓存。
+    按字体缓存的度量表通过 on_evict 注册回调，随字体一起淘汰。
+    """
+
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self._fonts = OrderedDict()
+        # (font_path, bold, italic) -> (path, index, simulated)
+        self._styles = {}
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_counts = Counter()
+        self._evict_hooks = []
+
+    def on_evict(self, hook):
+        # hook((path, size, index)) 在字体被淘汰或清空时调用
+        self._evict_hooks.append(hook)
+
+    def _evicted(self, key):
+        for hook in self._evict_hooks:
+            hook(key)
+
+    def load(self, path, size, index=0):
+        key = (path, size, index)
+        with self._lock:
+            font = self._fonts.get(key)
+            if font is not None:
+                self._fonts.move_to_end(key)
+                self.hits += 1
+                return font
+            self.misses += 1
+            # 加载失败时异常直接抛出，不缓存
+            font = ImageFont.truetype(path, size, index=index)
+            stats.count('font_loads')
+            self.load_counts[key] += 1
+            self._fonts[key] = font
+            while len(self._fonts) > self.maxsize:
+                evicted, _ = self._fonts.popitem(last=False)
+                self.evictions += 1
+                self._evicted(evicted)
+            return font
+
+    def resolve(self, font_path, font_size, bold=False, italic=False):
+        # 返回 (path, index, simulated)，simulated 表示需要多次绘制模拟粗体
+        key = (font_path, bold, italic)
+        with self._lock:
+            resolved = self._styles.get(key)
+            if resolved is None:
+                resolved = self._resolve_uncached(font_path, font_size, bold)
+                self._styles[key] = resolved
+            return resolved
+
+    def seed(self, font_path, bold, italic, resolved):
+        # 用编译缓存中的解析结果预填，跳过粗体字体探测
+        with self._lock:
+            self._styles.setdefault((font_path, bold, italic), tuple(resolved))
+
+    def _resolve_uncached(self, font_path, font_size, bold):
+        if not bold:
+            return (font_path, 0, False)
+        # 尝试常见的粗体字体文件
+        for bold_path in BOLD_FONT_PATHS:
+            if os.path.exists(bold_path):
+                try:
+                    self.load(bold_path, font_size)
+                    return (bold_path, 0, False)
+                except Exception:
+                    pass
+        # 如果无法找到粗体字体，尝试用字体索引
+        try:
+            self.load(font_path, font_size, index=1)  # 尝试索引1作为Bold
+            return (font_path, 1, False)
+        except Exception:
+            pass
+        # 最后的回退：模拟粗体（通过多次绘制）
+        logger.debug("使用模拟粗体: %s", font_path)
+        return (font_path, 0, True)
+
+    def get_font(self, font_path, font_size, bold=False, italic=False):
+        path, index, _ = self.resolve(font_path, font_size, bold, italic)
+        return self.load(path, font_size, index)
+
+    def is_simulated_bold(self, font_path, font_size, bold=False, italic=False):
+        return bold and self.resolve(font_path, font_size, bold, italic)[2]
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / total if total else 0.0,
+                'size': len(self._fonts),
+                'maxsize': self.maxsize,
+                # 同一字体被加载多次说明缓存容量不足
+                'reloaded': {'%s:%s:%s' % k: n for k, n in self.load_counts.items() if n > 1},
+            }
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._fonts):
+                self._evicted(key)
+            self._fonts.clear()
+            self._styles.clear()
+            self.hits = self.misses = self.evictions = 0
+            self.load_counts.clear()
+
+
+FONT_REGISTRY = FontRegistry()
+
+
+def get_font(font_path, font_size, bold=False, italic=False):
+    return FONT_REGISTRY.get_font(font_path, font_size, bold=bold, italic=italic)
+
+
+def font_stats():
+    return FONT_REGISTRY.stats()
@@ -0,0 +1,104 @@
+import os
+import threading
+from collections import OrderedDict
+from PIL import Image
+from . import stats
+
+
+def _mtime(path):
+    return os.stat(path).st_mtime_ns
+
+
+class ImageCache:
+    """Markdown 图片的解码缓存：(path, mtime, width, height) -> 缩放后的图片，按像素字节数 LRU 淘汰。
+
+    JPEG 用 draft 模式直接按接近目标的尺寸解码，大图不再整张解码后缩小。
+    图片尺寸按路径缓存，最多 max_sizes 个文件，同样 LRU 淘汰。
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_sizes=4096):
+        self.max_bytes = max_bytes
+        self.max_sizes = max_sizes
+        self._images = OrderedDict()
+        # path -> (mtime, (width, height))，文件改动后覆盖旧条目
+        self._sizes = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def size(self, path):
+        # 排版只需要尺寸，只读取文件头；修改时间没变就直接用缓存的尺寸
+        mtime = _mtime(path)
+        with self._lock:
+            cached = self._sizes.get(path)
+            if cached is not None and cached[0] == mtime:
+                self._sizes.move_to_end(path)
+                return cached[1]
+        stats.count('asset_opens')
+        with Image.open(path) as img:
+            size = img.size
+        with self._lock:
+            self._sizes[path] = (mtime, size)
+            self._sizes.move_to_end(path)
+            while len(self._sizes) > self.max_sizes:
+                self._sizes.popitem(last=False)
+        return size
+
+    def get(self, path, width, height):
+        key = (path, _mtime(path), width, height)
+        with self._lock:
+            img = self._images.get(key)
+            if img is not None:
+                self._images.move_to_end(key)
+                self.hits += 1
+                stats.count('image_cache_hits')
+                return img
+            self.misses += 1
+        img = self._decode(path, width, height)
+        nbytes = width * height * len(img.getbands())
+        with self._lock:
+            if key not in self._images and nbytes <= self.max_bytes:
+                self._images[key] = img
+                self._bytes += nbytes
+                while self._bytes > self.max_bytes:
+                    _, old = self._images.popitem(last=False)
+                    self._bytes -= old.width * old.height * len(old.getbands())
+                    self.evictions += 1
+        return img
+
+    def _decode(self, path, width, height):
+        stats.count('asset_opens')
+        with Image.open(path) as img:
+            if img.format == 'JPEG':
+                # 按不小于目标尺寸的 1/2、1/4、1/8 比例解码
+                img.draft('RGB', (width, height))
+            return img.resize((width, height))
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / total if total else 0.0,
+                'size': len(self._images),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._images.clear()
+            self._sizes.clear()
+            self._bytes = 0
+            self.hits = self.misses = self.evictions = 0
+
+
+IMAGE_CACHE = ImageCache()
+
+
+def image_cache_stats():
+    return IMAGE_CACHE.stats()
@@ -0,0 +1,122 @@
+from collections import namedtuple
+from .layout import TextItem, RectItem, LineItem, extract_text_from_ast
+from .linebreak import line_spans
+from . import stats
+
+LINK_COLOR = '#1976D2'
+CODE_COLOR = '#333333'
+CODE_BG = '#F5F5F5'
+
+# 段落中一段样式相同的文字；kind 为 None、'link'、'code'、'bullet'（列表项目符号）或 'break'（硬换行）
+Run = namedtuple('Run', 'text spec fake_bold color kind')
+
+
+def inline_runs(nodes, ctx, style, kind=None, runs=None):
+    """把行内节点展开为样式段，相邻的同样式文字合并。"""
+    if runs is None:
+        runs = []
+    for node in nodes:
+        node_type = node.get('type')
+        if node_type == 'strong':
+            inline_runs(node.get('children', []), ctx, dict(style, bold=True, font_color='#000000'), kind, runs)
+            continue
+        if node_type == 'emphasis':
+            inline_runs(node.get('children', []), ctx, dict(style, italic=True), kind, runs)
+            continue
+        if node_type == 'link':
+            inline_runs(node.get('children', []), ctx, dict(style, font_color=LINK_COLOR), 'link', runs)
+            continue
+        if node_type in ('linebreak', 'break'):
+            runs.append(Run('\n', None, False, None, 'break'))
+            continue
+        if node_type in ('codespan', 'inline_code'):
+            spec, fake_bold = ctx.font_spec({'font_size': style.get('font_size', ctx.template.font_size)})
+            run = Run(node.get('raw', ''), spec, fake_bold, CODE_COLOR, 'code')
+        else:
+            # softbreak 没有文字，和整段提取文字时一样不插入空格
+            spec, fake_bold = ctx.font_spec(style)
+            run = Run(extract_text_from_ast(node), spec, fake_bold, style.get('font_color'), kind)
+        if not run.text:
+            continue
+        last = runs[-1] if runs else None
+        if last is not None and last.kind != 'break' and last[1:] == run[1:]:
+            runs[-1] = last._replace(text=last.text + run.text)
+        else:
+            runs.append(run)
+    return runs
+
+
+def _split_breaks(runs):
+    # 按硬换行切成若干段，每段单独断行
+    parts = [[]]
+    for run in runs:
+        if run.kind == 'break':
+            parts.append([])
+        else:
+            parts[-1].append(run)
+    return parts
+
+
+def layout_runs(runs, ctx, x, y, max_width):
+    """逐行排版样式段，返回 (items, height)。
+
+    每段文字只用缓存的字宽测量一次，断行跨越样式边界；同一行各段按基线对齐。
+    只有一种样式时和整段排版完全相同。
+    """
+    if len(runs) == 1 and runs[0].kind is None:
+        run = runs[0]
+        lines = ctx.wrap(run.text, ctx.font(run.spec), max_width)
+        return ctx.text_lines(lines, run.spec, run.fake_bold, run.color, x, y)
+    backgrounds = []
+    items = []
+    total_height = 0
+    for part in _split_breaks(runs):
+        if not part:
+            continue
+        text = ''.join(run.text for run in part)
+        widths = []
+        owners = []
+        for index, run in enumerate(part):
+            widths.extend(ctx.metrics(run.spec).advances(run.text))
+            owners.extend([index] * len(run.text))
+        spans = line_spans(text, widths, max_width, None, ctx.template.word_break)
+        stats.count('wrapped_lines', len(spans))
+        for start, end in spans:
+            # 切出本行的各段：(run, 文字, 起点 x)
+            segments = []
+            pos = start
+            cx = x
+            while pos < end:
+                index = owners[pos]
+                stop = pos
+                while stop < end and owners[stop] == index:
+                    stop += 1
+                segments.append((part[index], text[pos:stop], cx))
+                cx += sum(widths[pos:stop])
+                pos = stop
+            ascent = max(ctx.metrics(run.spec).ascent for run, _, _ in segments)
+            top = bottom = None
+            for run, seg, _ in segments:
+                metrics = ctx.metrics(run.spec)
+                shift = ascent - metrics.ascent
+                seg_top, seg_bottom = metrics.extent(seg)
+                top = seg_top + shift if top is None else min(top, seg_top + shift)
+                bottom = seg_bottom + shift if bottom is None else max(bottom, seg_bottom + shift)
+            for run, seg, sx in segments:
+                metrics = ctx.metrics(run.spec)
+                sy = y + ascent - metrics.ascent
+                items.append(TextItem(sx, sy, seg, run.spec, run.color, run.fake_bold))
+                # 行末断行处的空格不算进底色和下划线
+                width = metrics.advance(seg.rstrip())
+                if run.kind == 'code':
+                    if width:
+                        backgrounds.append(RectItem((sx - 4, y + top - 4, sx + width + 4, y + bottom + 4), 6,
+                                                    CODE_BG, None, 0))
+                elif run.kind == 'link' and width:
+                    underline_y = y + ascent + 3
+                    items.append(LineItem((sx, underline_y, sx + width, underline_y), LINK_COLOR, 2))
+            h = (bottom - top) * ctx.line_spacing
+            y += h
+            total_height += h
+    # 行内代码的底色先画，不遮住文字
+    return backgrounds + items, total_height
@@ -0,0 +1,630 @@
+import logging
+from collections import namedtuple
+from .fonts import FONT_REGISTRY
+from .linebreak import break_lines
+from .metrics import font_metrics
+from .images import IMAGE_CACHE
+from . import stats
+from .stats import logger
+
+# Basic style mapping for markdown elements
+STYLE_MAP = {
+    'heading': {
+        1: {'font_size': 36, 'font_color': '#222222', 'bold': True},
+        2: {'font_size': 32, 'font_color': '#FF6600', 'bold': True},
+        3: {'font_size': 28, 'font_color': '#FF6600', 'bold': True},
+        4: {'font_size': 24, 'font_color': '#333333', 'bold': True},
+        5: {'font_size': 20, 'font_color': '#333333', 'bold': True},
+        6: {'font_size': 18, 'font_color': '#333333', 'bold': True},
+    },
+    'paragraph': {'font_size': 24, 'font_color': '#333333'},
+    'list': {'font_size': 24, 'font_color': '#333333'},
+    'blockquote': {'font_size': 24, 'font_color': '#FF6600', 'bg_color': '#FFF3E0'},
+    'strong': {'bold': True},
+    'emphasis': {'italic': True},
+}
+
+# 顶部导航栏高度，正文从 NAV_HEIGHT + 30 开始
+NAV_HEIGHT = 100
+CONTENT_TOP = NAV_HEIGHT + 30
+
+# 显示列表中的绘制指令，字体用 (path, size, index) 表示，便于跨进程传递；
+# TextItem.color 为 None 表示模板的 font_color，绘制时才确定，只有文字颜色不同的模板可以共用排版
+TextItem = namedtuple('TextItem', 'x y text font color fake_bold')
+RectItem = namedtuple('RectItem', 'box radius fill outline width')
+LineItem = namedtuple('LineItem', 'points fill width')
+ImageItem = namedtuple('ImageItem', 'x y src width height')
+
+# 一个块级节点的排版结果，items 的 y 坐标相对块顶部。
+# splits 为块内允许分页的位置（相对块顶部的 y）；header 为续页时重复的 (items, height)，如表头
+Block = namedtuple('Block', 'node height items splits header', defaults=((), None))
+
+
+class Page:
+    def __init__(self, blocks=None):
+        # [(y, Block)]，y 为块在页面上的绝对位置
+        self.blocks = blocks or []
+
+    @property
+    def nodes(self):
+        return [block.node for _, block in self.blocks]
+
+    @property
+    def items(self):
+        result = []
+        for y, block in self.blocks:
+            result.extend(translate(block.items, 0, y))
+        return result
+
+    @property
+    def bottom(self):
+        if not self.blocks:
+            return CONTENT_TOP
+        y, block = self.blocks[-1]
+        return y + block.height
+
+
+def translate(items, dx, dy):
+    moved = []
+    for item in items:
+        if isinstance(item, TextItem):
+            moved.append(item._replace(x=item.x + dx, y=item.y + dy))
+        elif isinstance(item, RectItem):
+            x1, y1, x2, y2 = item.box
+            moved.append(item._replace(box=(x1 + dx, y1 + dy, x2 + dx, y2 + dy)))
+        elif isinstance(item, LineItem):
+            x1, y1, x2, y2 = item.points
+            moved.append(item._replace(points=(x1 + dx, y1 + dy, x2 + dx, y2 + dy)))
+        elif isinstance(item, ImageItem):
+            moved.append(item._replace(x=item.x + dx, y=item.y + dy))
+    return moved
+
+
+def scale_items(items, scale):
+    # 按比例缩放显示列表（坐标、字号、线宽），用于同一排版输出多种分辨率
+    if scale == 1:
+        return items
+    scaled = []
+    for item in items:
+        if isinstance(item, TextItem):
+            path, size, index = item.font
+            scaled.append(item._replace(x=item.x * scale, y=item.y * scale,
+                                        font=(path, max(1, round(size * scale)), index)))
+        elif isinstance(item, RectItem):
+            scaled.append(item._replace(box=tuple(v * scale for v in item.box), radius=item.radius * scale,
+                                        width=max(1, round(item.width * scale)) if item.width else 0))
+        elif isinstance(item, LineItem):
+            scaled.append(item._replace(points=tuple(v * scale for v in item.points),
+                                        width=max(1, round(item.width * scale))))
+        elif isinstance(item, ImageItem):
+            scaled.append(item._replace(x=item.x * scale, y=item.y * scale, width=max(1, round(item.width * scale)),
+                                        height=max(1, round(item.height * scale))))
+        else:
+            scaled.append(item)
+    return scaled
+
+
+def extract_text_from_ast(ast):
+    # Recursively extract text from AST nodes, including 'raw' field
+    if isinstance(ast, str):
+        return ast
+    if isinstance(ast, list):
+        return ''.join([extract_text_from_ast(item) for item in ast])
+    if isinstance(ast, dict):
+        if 'raw' in ast:
+            return ast['raw']
+        if 'children' in ast and ast['children']:
+            return extract_text_from_ast(ast['children'])
+        if 'text' in ast:
+            return ast['text']
+        # 尝试提取所有可能的文本字段
+        for field in ['content', 'value', 'literal']:
+            if field in ast:
+                return ast[field]
+    return ''
+
+
+def measure_bbox(font, text):
+    stats.count('bbox_calls')
+    return font.getbbox(text)
+
+
+def heading_level(node):
+    return node.get('attrs', {}).get('level', node.get('level', 1))
+
+
+def image_source(node):
+    return node.get('attrs', {}).get('url') or node.get('src') or node.get('url')
+
+
+def sole_image(node):
+    # 只包含一张图片的段落按图片块排版
+    children = [c for c in node.get('children', []) if c.get('type') not in ('softbreak', 'linebreak')]
+    if len(children) == 1 and children[0].get('type') == 'image':
+        return children[0]
+    return None
+
+
+class LayoutContext:
+    def __init__(self, template, draw=None):
+        self.template = template
+        # 测量只依赖字体度量，不需要画布；传入 draw 时断行改用 draw.textbbox（结果相同）
+        self.draw = draw
+        # 编译好的样式直接查表，其余组合首次用到时解析；编译好的纵向度量已预填到 font_metrics
+        compiled = template.compiled
+        self.styles = compiled.styles
+        self._specs = dict(compiled.specs)
+        self.font_path = template.font_path
+        self.line_spacing = template.line_spacing
+        self.left = template.margins['left']
+        self.max_text_width = template.width - template.margins['left'] - template.margins['right']
+
+    def font_spec(self, style):
+        key = (style.get('font_size', self.template.font_size), style.get('bold', False), style.get('italic', False))
+        resolved = self._specs.get(key)
+        if resolved is None:
+            size, bold, italic = key
+            path, index, fake_bold = FONT_REGISTRY.resolve(self.font_path, size, bold, italic)
+            resolved = self._specs[key] = ((path, size, index), fake_bold)
+        return resolved
+
+    def font(self, spec):
+        return FONT_REGISTRY.load(*spec)
+
+    def metrics(self, spec):
+        return font_metrics(spec)
+
+    def wrap(self, text, font, max_width):
+        return break_lines(text, font, max_width, self.draw, self.template.word_break)
+
+    def text_lines(self, lines, spec, fake_bold, color, x, y):
+        # 逐行生成文本指令，返回 (items, height)
+        metrics = self.metrics(spec)
+        items = []
+        total_height = 0
+        for line in lines:
+            items.append(TextItem(x, y, line, spec, color, fake_bold))
+            h = metrics.ink_height(line) * self.line_spacing
+            y += h
+            total_height += h
+        return items, total_height
+
+    def text(self, text, style, x, y, max_width=None):
+        spec, fake_bold = self.font_spec(style)
+        color = style.get('font_color')
+        lines = self.wrap(text, self.font(spec), max_width or self.max_text_width)
+        return self.text_lines(lines, spec, fake_bold, color, x, y)
+
+
+def layout_list(node, ctx, x, y, max_width):
+    """列表项中的段落按样式段排版，第一段前加项目符号，后续段落和项目符号后的文字对齐；
+    嵌套列表缩进一个项目符号的宽度后递归排版。返回 (items, height)。
+    """
+    from .inline import inline_runs, layout_runs
+    style = STYLE_MAP['list']
+    indent = ctx.metrics(ctx.styles['list'].spec).advance('• ')
+    items = []
+    total = 0
+    for item in node.get('children', []):
+        children = item.get('children', []) or [{'type': 'block_text', 'children': []}]
+        for index, child in enumerate(children):
+            child_type = child.get('type')
+            if child_type == 'list':
+                sub, h = layout_list(child, ctx, x + indent, y + total, max_width - indent)
+            else:
+                if child_type in ('block_text', 'paragraph'):
+                    inline = list(child.get('children', []))
+                else:
+                    # 代码块、引用等其他块级内容按纯文本排版
+                    inline = [{'type': 'text', 'raw': extract_text_from_ast(child)}]
+                if index == 0:
+                    # 项目符号单独成段，不和后面的文字合并，各项的符号能共用同一个文字蒙版
+                    runs = inline_runs([{'type': 'text', 'raw': '• '}], ctx, style, 'bullet')
+                    runs = inline_runs(inline, ctx, style, runs=runs)
+                    sub, h = layout_runs(runs, ctx, x, y + total, max_width)
+                else:
+                    runs = inline_runs(inline, ctx, style)
+                    sub, h = layout_runs(runs, ctx, x + indent, y + total, max_width - indent) if runs else ([], 0)
+            items.extend(sub)
+            total += h
+    return items, total
+
+
+def layout_node(node, x, y, ctx, parent_style=None):
+    # 返回 (items, height)，items 使用绝对坐标
+    node_type = node.get('type')
+    template = ctx.template
+    max_text_width = ctx.max_text_width
+
+    if node_type in ['blockquote', 'block_quote']:
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("发现引用节点类型: %s, 内容: %s", node_type, extract_text_from_ast(node))
+        node_type = 'blockquote'  # 统一为blockquote类型
+
+    if node_type == 'heading':
+        style = STYLE_MAP['heading'].get(heading_level(node), STYLE_MAP['heading'][1])
+        text = extract_text_from_ast(node.get('children', ''))
+        items, h = ctx.text(text, style, x, y)
+        return items, h + 18
+    elif node_type == 'paragraph':
+        image = sole_image(node)
+        if image is not None:
+            return layout_node(image, x, y, ctx, parent_style)
+        # 行内的粗体、斜体、链接和代码按样式段排版
+        from .inline import inline_runs, layout_runs
+        runs = inline_runs(node.get('children', []), ctx, STYLE_MAP['paragraph'])
+        if not runs:
+            return [], 0
+        return layout_runs(runs, ctx, x, y, max_text_width)
+    elif node_type == 'list':
+        return layout_list(node, ctx, x, y, max_text_width)
+    elif node_type == 'blockquote':
+        style = STYLE_MAP['blockquote']
+        bg_color = style.get('bg_color', '#FFF3E0')
+        spec, fake_bold = ctx.font_spec(style)
+        font = ctx.font(spec)
+        color = style.get('font_color')
+        padding = 24
+        quote_x = x - 18
+
+        # 引用内容只断行一次，背景高度和文字共用同一组行
+        text_items = []
+        text_height = 0
+        for child in node.get('children', []):
+            child_text = extract_text_from_ast(child.get('children', []))
+            if not child_text:
+                child_text = extract_text_from_ast(child)
+            if child_text:
+                lines = ctx.wrap(child_text, font, max_text_width - 30)
+                sub, h = ctx.text_lines(lines, spec, fake_bold, color, x + 16, y + padding // 2 + text_height)
+                text_items.extend(sub)
+                text_height += h
+
+        # 如果高度太小，设置最小高度
+        total_height = max(text_height, 50)
+        # 背景和边框都在块内部，块高度包含上下内边距和下方间距
+        items = [
+            # 圆角背景
+            RectItem((quote_x + 4, y, x + max_text_width, y + total_height + padding), 16, bg_color, None, 0),
+            # 左侧橙色边框
+            LineItem((quote_x, y + padding // 2, quote_x, y + total_height + padding), '#FFB300', 8),
+        ]
+        items.extend(text_items)
+        return items, total_height + padding + padding // 2
+    elif node_type == 'thematic_break':
+        line_y = y + 18
+        return [LineItem((x, line_y, template.width - template.margins['right'], line_y), '#E5E5E5', 6)], 36
+    elif node_type == 'strong':
+        style = parent_style.copy() if parent_style else STYLE_MAP['paragraph'].copy()
+        style['bold'] = True
+        style['font_color'] = '#000000'  # 确保加粗文本颜色足够深
+        return ctx.text(extract_text_from_ast(node.get('children', '')), style, x, y)
+    elif node_type == 'emphasis':
+        style = parent_style.copy() if parent_style else {}
+        style['italic'] = True
+        return ctx.text(extract_text_from_ast(node.get('children', '')), style, x, y)
+    elif node_type == 'delete':
+        style = parent_style.copy() if parent_style else STYLE_MAP['paragraph'].copy()
+        text = extract_text_from_ast(node.get('children', ''))
+        items, h = ctx.text(text, style, x, y)
+        # 画删除线
+        spec, _ = ctx.font_spec({'font_size': style.get('font_size', template.font_size)})
+        bbox = measure_bbox(ctx.font(spec), text)
+        mid_y = y + (bbox[3] - bbox[1]) // 2
+        items.append(LineItem((x, mid_y, x + bbox[2] - bbox[0], mid_y), '#888888', 3))
+        return items, h
+    elif node_type in ['code', 'block_code']:
+        return layout_code(node, x, y, ctx)[:2]
+    elif node_type in ['inline_code', 'codespan']:
+        # 行内代码
+        code_text = node.get('raw', '')
+        spec, _ = ctx.font_spec({'font_size': 28})
+        pad = 6
+        bbox = measure_bbox(ctx.font(spec), code_text)
+        h = bbox[3] - bbox[1]
+        w = bbox[2] - bbox[0]
+        items = [
+            RectItem((x, y, x + w + 2 * pad, y + h + 2 * pad), 6, '#F5F5F5', None, 0),
+            TextItem(x + pad, y + pad, code_text, spec, '#333333', False),
+        ]
+        return items, h + 2 * pad
+    elif node_type == 'link':
+        # 链接文本蓝色下划线
+        style = parent_style.copy() if parent_style else STYLE_MAP['paragraph'].copy()
+        style['font_color'] = '#1976D2'
+        text = extract_text_from_ast(node.get('children', ''))
+        items, h = ctx.text(text, style, x, y)
+        spec, _ = ctx.font_spec({'font_size': style.get('font_size', template.font_size)})
+        bbox = measure_bbox(ctx.font(spec), text)
+        underline_y = y + bbox[3] - bbox[1]
+        items.append(LineItem((x, underline_y, x + bbox[2] - bbox[0], underline_y), '#1976D2', 2))
+        return items, h
+    elif node_type == 'image':
+        # 缩放到最大宽度，只读取图片头获得尺寸
+        img_path = image_source(node)
+        try:
+            src_w, src_h = IMAGE_CACHE.size(img_path)
+            ratio = min(max_text_width / src_w, 1.0)
+            new_w = int(src_w * ratio)
+            new_h = int(src_h * ratio)
+            return [ImageItem(x, y, img_path, new_w, new_h)], new_h + 10
+        except Exception:
+            return ctx.text('[图片加载失败]', STYLE_MAP['paragraph'], x, y)
+    elif node_type in ['break', 'linebreak']:
+        return [], 12
+    elif node_type == 'table':
+        return layout_table(node, x, y, ctx)[:2]
+    else:
+        items = []
+        total = 0
+        if 'children' in node:
+            for child in node['children']:
+                sub, h = layout_node(child, x, y + total, ctx, parent_style)
+                items.extend(sub)
+                total += h
+        return items, total
+
+
+def layout_code(node, x, y, ctx):
+    # 代码块：超宽的行按字符折行，每行之间都可以分页；返回 (items, height, splits, header)
+    code_text = node.get('raw', '')
+    spec = ctx.styles['code'].spec
+    code_metrics = ctx.metrics(spec)
+    max_text_width = ctx.max_text_width
+    pad = 16
+    lines = []
+    for line in code_text.rstrip('\n').split('\n'):
+        if code_metrics.advance(line) > max_text_width:
+            lines.extend(break_lines(line, ctx.font(spec), max_text_width, ctx.draw))
+        else:
+            lines.append(line)
+    text_items = []
+    splits = []
+    h = 0
+    for line in lines:
+        if h:
+            splits.append(pad + h)
+        text_items.append(TextItem(x, y + pad + h, line, spec, '#333333', False))
+        h += code_metrics.ink_height(line) + 8
+    # 背景在块内部，下方留出 pad 间距
+    items = [RectItem((x - pad, y, x + max_text_width + pad, y + h + 2 * pad), 12, '#F5F5F5', None, 0)]
+    items.extend(text_items)
+    # 续页顶部留出内边距，被切开的背景向上延伸覆盖它
+    return items, h + 3 * pad, splits, ([], pad)
+
+
+def table_rows(node):
+    # mistune 的表格为 table_head（直接包含单元格）+ table_body（包含行）；返回 (表头单元格, [行单元格])
+    head = None
+    rows = []
+    for child in node.get('children', []):
+        child_type = child.get('type')
+        if child_type == 'table_head':
+            head = child.get('children', [])
+        elif child_type == 'table_body':
+            rows.extend(row.get('children', []) for row in child.get('children', []))
+        else:
+            rows.append(child.get('children', []))
+    return head, rows
+
+
+def allocate_columns(natural, available):
+    # 总宽放得下时按内容宽度；否则窄列保持原宽，剩余宽度平均分给宽列（超出部分在单元格内折行）
+    if sum(natural) <= available:
+        return list(natural)
+    widths = [None] * len(natural)
+    remaining = available
+    open_cols = list(range(len(natural)))
+    while open_cols:
+        share = remaining / len(open_cols)
+        narrow = [i for i in open_cols if natural[i] <= share]
+        if not narrow:
+            for i in open_cols:
+                widths[i] = max(int(share), 1)
+            break
+        for i in narrow:
+            widths[i] = natural[i]
+            remaining -= natural[i]
+        open_cols = [i for i in open_cols if natural[i] > share]
+    return widths
+
+
+def layout_table(node, x, y, ctx):
+    # 表格：每个单元格只测量一次，列宽限制在正文宽度内，行与行之间可以分页，续页重复表头。
+    # 返回 (items, height, splits, header)
+    cell_pad = 12
+    spec = ctx.styles['table'].spec
+    head_spec, head_bold = ctx.font_spec({'font_size': spec[1], 'bold': True})
+    metrics = ctx.metrics(spec)
+    head, rows = table_rows(node)
+    all_rows = ([head] if head is not None else []) + rows
+    ncols = max((len(cells) for cells in all_rows), default=0)
+    if not ncols:
+        return [], 0, [], None
+
+    # [(文本, 对齐, 内容宽度)]，列宽分配和绘制共用
+    measured = []
+    natural = [0] * ncols
+    for r, cells in enumerate(all_rows):
+        cell_spec = head_spec if r == 0 and head is not None else spec
+        row = []
+        for i, cell in enumerate(cells):
+            text = extract_text_from_ast(cell.get('children', '')).strip()
+            width = ctx.metrics(cell_spec).advance(text)
+            row.append((text, cell.get('attrs', {}).get('align'), width))
+            natural[i] = max(natural[i], width)
+        measured.append(row)
+    col_w = allocate_columns([int(w) + 1 for w in natural], ctx.max_text_width - ncols * 2 * cell_pad)
+
+    line_h = metrics.line_height
+    items = []
+    header = None
+    splits = []
+    yy = y
+    for r, row in enumerate(measured):
+        is_head = r == 0 and head is not None
+        cell_spec, fake_bold = (head_spec, head_bold) if is_head else (spec, False)
+        fill = '#F0F0F0' if is_head else '#FAFAFA'
+        cell_lines = []
+        for i, (text, align, width) in enumerate(row):
+            if width > col_w[i]:
+                lines = ctx.wrap(text, ctx.font(cell_spec), col_w[i])
+                cell_lines.append([(line, ctx.metrics(cell_spec).advance(line)) for line in lines])
+            else:
+                cell_lines.append([(text, width)])
+        row_h = max(len(lines) for lines in cell_lines) * line_h + 2 * cell_pad
+        row_items = []
+        xx = x
+        for i in range(ncols):
+            w = col_w[i] + 2 * cell_pad
+            row_items.append(RectItem((xx, yy, xx + w, yy + row_h), 0, fill, '#CCCCCC', 2))
+            if i < len(row):
+                align = row[i][1]
+                for n, (line, width) in enumerate(cell_lines[i]):
+                    offset = 0
+                    if align == 'center':
+                        offset = (col_w[i] - width) / 2
+                    elif align == 'right':
+                        offset = col_w[i] - width
+                    row_items.append(TextItem(xx + cell_pad + offset, yy + cell_pad + n * line_h, line,
+                                              cell_spec, '#333333', fake_bold))
+            xx += w
+        items.extend(row_items)
+        yy += row_h
+        if is_head:
+            header = (translate(row_items, 0, -y), row_h)
+        elif r < len(measured) - 1:
+            splits.append(yy - y)
+    return items, yy - y + 18, splits, header
+
+
+def slice_items(items, start, end, extend=0):
+    # 取出块内 [start, end) 范围的绘制指令并移到新的顶部；跨越边界的背景和竖线被裁剪，
+    # 从上一页延续下来的背景再向上延伸 extend 像素
+    sliced = []
+    for item in items:
+        if isinstance(item, (TextItem, ImageItem)):
+            if start <= item.y < end:
+                sliced.append(item._replace(y=item.y - start))
+        elif isinstance(item, RectItem):
+            x1, y1, x2, y2 = item.box
+            if y1 < end and y2 > start:
+                top = y1 - start if y1 >= start else -extend
+                sliced.append(item._replace(box=(x1, top, x2, min(y2, end) - start)))
+        elif isinstance(item, LineItem):
+            x1, y1, x2, y2 = item.points
+            if y1 == y2:
+                if start <= y1 < end:
+                    sliced.append(item._replace(points=(x1, y1 - start, x2, y2 - start)))
+            elif min(y1, y2) < end and max(y1, y2) > start:
+                sliced.append(item._replace(points=(x1, min(max(y1, start), end) - start,
+                                                    x2, min(max(y2, start), end) - start)))
+    return sliced
+
+
+def slice_block(block, start, end, repeat_header=False):
+    if repeat_header and block.header is not None:
+        header_items, header_h = block.header
+        items = list(header_items) + translate(slice_items(block.items, start, end, header_h), 0, header_h)
+        height = end - start + header_h
+    else:
+        items = slice_items(block.items, start, end)
+        height = end - start
+    return Block(block.node, height, items)
+
+
+def fit_block(block, room, page_room):
+    """把块放进剩余高度 room 的当前页，放不下时在 splits 处切开。
+
+    依次产出 (块或其片段, 是否需要先换页)；page_room 为整页可用高度。
+    不可拆分的块和原来一样整体放到下一页。
+    """
+    if block.height <= room or not block.splits:
+        yield block, block.height > room
+        return
+    start = 0
+    repeat = False
+    limit = room
+    new_page = False
+    while True:
+        header_h = block.header[1] if repeat and block.header else 0
+        if block.height - start + header_h <= limit:
+            yield slice_block(block, start, block.height, repeat), new_page
+            return
+        fits = [s for s in block.splits if start < s and s - start + header_h <= limit]
+        if not fits and limit < page_room:
+            # 当前页连一行都放不下，从下一页开始
+            limit = page_room
+            new_page = True
+            continue
+        if fits:
+            cut = fits[-1]
+        else:
+            # 单行比整页还高，只能超出
+            cut = next((s for s in block.splits if s > start), block.height)
+        yield slice_block(block, start, cut, repeat), new_page
+        if cut >= block.height:
+            return
+        start = cut
+        repeat = True
+        limit = page_room
+        new_page = True
+
+
+def layout_block(node, ctx):
+    node_type = node.get('type')
+    if node_type in ('code', 'block_code'):
+        items, height, splits, header = layout_code(node, ctx.left, 0, ctx)
+        return Block(node, height, items, splits, header)
+    if node_type == 'table':
+        items, height, splits, header = layout_table(node, ctx.left, 0, ctx)
+        return Block(node, height, items, splits, header)
+    items, height = layout_node(node, ctx.left, 0, ctx)
+    return Block(node, height, items)
+
+
+def layout_ast(ast, template, ctx=None):
+    # 每个块只排版一次，分页和绘制共用结果
+    with stats.stage('layout'):
+        ctx = ctx or LayoutContext(template)
+        return [layout_block(node, ctx) for node in ast]
+
+
+def paginate_blocks(blocks, template):
+    with stats.stage('paginate'):
+        return _paginate_blocks(blocks, template)
+
+
+def _paginate_blocks(blocks, template):
+    return [page for page, _ in iter_pages(((block, False) for block in blocks), template)]
+
+
+def iter_pages(entries, template, start=0):
+    """依次放置 (block, forced) 条目，每排满一页就产出 (page, (first, end))。
+
+    forced 为真的条目从新的一页开始（手动分页）。(first, end) 是页面包含的条目序号范围，
+    不含 end，序号从 start 开始计；块被拆到两页时两页的范围都包含它。
+    """
+    max_y = template.height - template.margins['bottom']
+    current = Page()
+    first = start
+    current_y = CONTENT_TOP
+    index = start - 1
+    for index, (block, forced) in enumerate(entries, start):
+        if forced and current.blocks:
+            yield current, (first, index)
+            current, first, current_y = Page(), index, CONTENT_TOP
+        placed = False
+        for part, new_page in fit_block(block, max_y - current_y, max_y - CONTENT_TOP):
+            if new_page and current.blocks:
+                yield current, (first, index + 1 if placed else index)
+                current, first, current_y = Page(), index, CONTENT_TOP
+            current.blocks.append((current_y, part))
+            current_y += part.height
+            placed = True
+    if current.blocks:
+        yield current, (first, index + 1)
+
+
+def layout_pages(ast, template, ctx=None):
+    return paginate_blocks(layout_ast(ast, template, ctx), template)
@@ -0,0 +1,147 @@
+import threading
+from . import stats
+from .fonts import FONT_REGISTRY
+
+# 不能出现在行首的标点（避头）
+NO_LINE_START = set('，。、；：？！）》」』】〕〉”’…—～·,.;:?!)]}%')
+# 不能出现在行尾的标点（避尾）
+NO_LINE_END = set('（《「『【〔〈“‘([{')
+
+# 每个字体一张字宽表：(path, size, index) -> {char: advance}
+# 字体从 FONT_REGISTRY 淘汰时一起丢弃；不经注册表加载的字体按插入顺序淘汰，最多和注册表一样多
+_ADVANCE_CACHE = {}
+_lock = threading.Lock()
+FONT_REGISTRY.on_evict(lambda key: _ADVANCE_CACHE.pop(key, None))
+
+
+def font_key(font):
+    return (getattr(font, 'path', None), getattr(font, 'size', None), getattr(font, 'index', 0))
+
+
+def glyph_advances(font, text):
+    key = font_key(font)
+    table = _ADVANCE_CACHE.get(key)
+    if table is None:
+        with _lock:
+            table = _ADVANCE_CACHE.get(key)
+            if table is None:
+                while len(_ADVANCE_CACHE) >= FONT_REGISTRY.maxsize:
+                    _ADVANCE_CACHE.pop(next(iter(_ADVANCE_CACHE)))
+                table = _ADVANCE_CACHE[key] = {}
+    widths = []
+    for ch in text:
+        w = table.get(ch)
+        if w is None:
+            w = font.getlength(ch)
+            table[ch] = w
+        widths.append(w)
+    return widths
+
+
+def seed_advances(key, widths):
+    # 预填已知的字宽（如编译缓存中的空格宽度），key 同 font_key
+    with _lock:
+        table = _ADVANCE_CACHE.get(key)
+        if table is None:
+            while len(_ADVANCE_CACHE) >= FONT_REGISTRY.maxsize:
+                _ADVANCE_CACHE.pop(next(iter(_ADVANCE_CACHE)))
+            table = _ADVANCE_CACHE[key] = {}
+    for ch, width in widths.items():
+        table.setdefault(ch, width)
+
+
+def advance_cache_info():
+    return {'fonts': len(_ADVANCE_CACHE), 'glyphs': sum(len(t) for t in _ADVANCE_CACHE.values())}
+
+
+def is_cjk(ch):
+    cp = ord(ch)
+    return (0x2E80 <= cp <= 0x9FFF or 0xAC00 <= cp <= 0xD7AF or 0xF900 <= cp <= 0xFAFF
+            or 0xFF00 <= cp <= 0xFFEF or cp >= 0x20000)
+
+
+def can_break_before(text, i):
+    # i 位置之前能否断行（即 text[i-1] 和 text[i] 之间）
+    prev, cur = text[i - 1], text[i]
+    if cur in NO_LINE_START or prev in NO_LINE_END:
+        return False
+    if prev.isspace() or cur.isspace():
+        return True
+    return is_cjk(prev) or is_cjk(cur)
+
+
+def _measurer(font, draw):
+    if draw is not None:
+        def measure(s):
+            stats.count('bbox_calls')
+            bbox = draw.textbbox((0, 0), s, font=font)
+            return bbox[2] - bbox[0]
+    else:
+        def measure(s):
+            stats.count('bbox_calls')
+            bbox = font.getbbox(s)
+            return bbox[2] - bbox[0]
+    return measure
+
+
+def _fit(text, widths, start, max_width, measure):
+    # 用字宽累加估算断点，再用少量实际测量校正（字宽和墨迹宽度略有差别）
+    n = len(text)
+    acc = 0
+    k = start
+    while k < n and acc + widths[k] <= max_width:
+        acc += widths[k]
+        k += 1
+    if k == start:
+        k = start + 1
+    if measure is None:
+        return k
+    while k - start > 1 and measure(text[start:k]) > max_width:
+        k -= 1
+    while k < n and measure(text[start:k + 1]) <= max_width:
+        k += 1
+    return k
+
+
+def line_spans(text, widths, max_width, measure=None, mode='char'):
+    """按字宽断行，返回每行在 text 中的 [(start, end)]。
+
+    measure 为 None 时只用字宽累加（混排多种字体的段落无法整行测量）；
+    mode 的含义同 break_lines，word 模式下行尾空格不计入该行。
+    """
+    n = len(text)
+    spans = []
+    start = 0
+    while start < n:
+        end = _fit(text, widths, start, max_width, measure)
+        if mode == 'word' and end < n:
+            k = end
+            while k > start + 1 and not can_break_before(text, k):
+                k -= 1
+            if k > start + 1 or can_break_before(text, k):
+                end = k
+        line_end = end
+        if mode == 'word':
+            while line_end > start and text[line_end - 1].isspace():
+                line_end -= 1
+            while end < n and text[end] == ' ':
+                end += 1
+        if line_end > start or mode != 'word':
+            spans.append((start, line_end))
+        start = end
+    return spans
+
+
+def break_lines(text, font, max_width, draw=None, mode='char'):
+    """按最大宽度断行。
+
+    mode='char'：逐字符贪心（和旧 wrap_text 结果一致，长单词/长数字会被拆开）；
+    mode='word'：英文按单词断行、中文任意字间断行，并遵守避头尾规则，
+    单词本身超宽时退回逐字符拆分。
+    """
+    if not text:
+        return []
+    widths = glyph_advances(font, text)
+    lines = [text[start:end] for start, end in line_spans(text, widths, max_width, _measurer(font, draw), mode)]
+    stats.count('wrapped_lines', len(lines))
+    return lines
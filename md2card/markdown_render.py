@@ -1,530 +1,259 @@
-import mistune
-from PIL import Image, ImageDraw, ImageFont
-import pprint
+from PIL import Image, ImageDraw
 import os
-import re
+import json
+from .templates import Template
+from . import stats
+from .stats import logger
+from .encode import OutputOptions, EncodePool, encode_to_file
+from .cache import page_key
+from .fonts import FONT_REGISTRY
+from .linebreak import break_lines
+from .textruns import TEXT_RUNS
+from .parser import parse
+from .images import IMAGE_CACHE
+from .layout import (CONTENT_TOP, TextItem, RectItem, LineItem, ImageItem, Page, LayoutContext, scale_items,
+                     layout_node, layout_ast, layout_pages)
 
-# Basic style mapping for markdown elements
-STYLE_MAP = {
-    'heading': {
-        1: {'font_size': 36, 'font_color': '#222222', 'bold': True},
-        2: {'font_size': 32, 'font_color': '#FF6600', 'bold': True},
-        3: {'font_size': 28, 'font_color': '#FF6600', 'bold': True},
-        4: {'font_size': 24, 'font_color': '#333333', 'bold': True},
-        5: {'font_size': 20, 'font_color': '#333333', 'bold': True},
-        6: {'font_size': 18, 'font_color': '#333333', 'bold': True},
-    },
-    'paragraph': {'font_size': 24, 'font_color': '#333333'},
-    'list': {'font_size': 24, 'font_color': '#333333'},
-    'blockquote': {'font_size': 24, 'font_color': '#FF6600', 'bg_color': '#FFF3E0'},
-    'strong': {'bold': True},
-    'emphasis': {'italic': True},
-}
-
-# 常见系统字体路径
-BOLD_FONT_PATHS = [
-    "/System/Library/Fonts/PingFang.ttc",  # macOS
-    "/System/Library/Fonts/STHeiti Medium.ttc",  # macOS 备选
-    "/System/Library/Fonts/Microsoft/SimHei.ttf",  # Windows
-    "/usr/share/fonts/truetype/noto/NotoSansCJK-Bold.ttc",  # Linux
-]
-
-def get_font(font_path, font_size, bold=False, italic=False):
-    # 尝试加载粗体字体
-    if bold:
-        # 尝试常见的粗体字体文件
-        for bold_path in BOLD_FONT_PATHS:
-            if os.path.exists(bold_path):
-                try:
-                    return ImageFont.truetype(bold_path, font_size)
-                except:
-                    pass
-                    
-        # 如果无法找到粗体字体，尝试用字体索引
-        try:
-            return ImageFont.truetype(font_path, font_size, index=1)  # 尝试索引1作为Bold
-        except:
-            pass
-            
-        # 最后的回退：模拟粗体（通过多次绘制）
-        print("使用模拟粗体")
-        return ImageFont.truetype(font_path, font_size)
-    else:
-        return ImageFont.truetype(font_path, font_size)
-
-def wrap_text(text, font, max_width, draw):
-    # 逐字符累加，超宽就换行，适配中英文、长单词、长数字
-    lines = []
-    current_line = ''
-    for char in text:
-        test_line = current_line + char
-        bbox = draw.textbbox((0, 0), test_line, font=font)
-        width = bbox[2] - bbox[0]
-        if width <= max_width:
-            current_line = test_line
-        else:
-            if current_line:
-                lines.append(current_line)
-            current_line = char
-    if current_line:
-        lines.append(current_line)
-    return lines
-
-def extract_text_from_ast(ast):
-    # Recursively extract text from AST nodes, including 'raw' field
-    if isinstance(ast, str):
-        return ast
-    if isinstance(ast, list):
-        return ''.join([extract_text_from_ast(item) for item in ast])
-    if isinstance(ast, dict):
-        if 'raw' in ast:
-            return ast['raw']
-        if 'children' in ast and ast['children']:
-            return extract_text_from_ast(ast['children'])
-        if 'text' in ast:
-            return ast['text']
-        # 尝试提取所有可能的文本字段
-        for field in ['content', 'value', 'literal']:
-            if field in ast:
-                return ast[field]
-    return ''
+def wrap_text(text, font, max_width, draw=None, mode='char'):
+    # 按字宽表累加找断点，每行只需少量实际测量，整体线性时间
+    return break_lines(text, font, max_width, draw, mode)
 
 def draw_rounded_rectangle(draw, xy, radius, fill):
     x1, y1, x2, y2 = xy
     draw.rounded_rectangle([x1, y1, x2, y2], radius=radius, fill=fill)
 
-def measure_text(text, style, font_path, max_text_width, draw, line_spacing, bg=None, pad_x=0, pad_y=0):
-    font = get_font(font_path, style.get('font_size', 48))
-    lines = wrap_text(text, font, max_text_width if not bg else max_text_width-2*pad_x, draw)
-    total_height = 0
-    for line in lines:
-        bbox = font.getbbox(line)
-        h = bbox[3] - bbox[1]
-        total_height += h * line_spacing
-    if bg:
-        total_height += 2*pad_y
-    return total_height
-
 def measure_node(node, x, y, draw, template, parent_style=None):
-    node_type = node.get('type')
-    width, height = template.width, template.height
-    line_spacing = template.line_spacing
-    font_path = template.font_path
-    max_text_width = width - template.margins['left'] - template.margins['right']
-    if node_type == 'heading':
-        level = node.get('level', 1)
-        style = STYLE_MAP['heading'].get(level, STYLE_MAP['heading'][1])
-        text = extract_text_from_ast(node.get('children', ''))
-        h = measure_text(text, style, font_path, max_text_width, draw, line_spacing)
-        return h + 18
-    elif node_type == 'paragraph':
-        style = STYLE_MAP['paragraph']
-        text = extract_text_from_ast(node.get('children', ''))
-        h = measure_text(text, style, font_path, max_text_width, draw, line_spacing)
-        return h
-    elif node_type == 'list':
-        style = STYLE_MAP['list']
-        total = 0
-        for item in node.get('children', []):
-            text = '• ' + extract_text_from_ast(item.get('children', ''))
-            h = measure_text(text, style, font_path, max_text_width, draw, line_spacing)
-            total += h
-        return total
-    elif node_type == 'blockquote':
-        style = STYLE_MAP['blockquote']
-        total_height = 0
-        padding = 24
-        
-        for child in node.get('children', []):
-            child_text = extract_text_from_ast(child.get('children', ''))
-            font = get_font(font_path, style.get('font_size', template.font_size), 
-                           bold=style.get('bold', False), 
-                           italic=style.get('italic', False))
-            lines = wrap_text(child_text, font, max_text_width - 30, draw)
-            for line in lines:
-                bbox = font.getbbox(line)
-                h = bbox[3] - bbox[1]
-                total_height += h * line_spacing
-                
-        return total_height + padding
-    elif node_type == 'thematic_break':
-        return 36
-    elif node_type == 'strong' or node_type == 'emphasis':
-        style = parent_style.copy() if parent_style else {}
-        if node_type == 'strong':
-            style['bold'] = True
-        if node_type == 'emphasis':
-            style['italic'] = True
-        text = extract_text_from_ast(node.get('children', ''))
-        h = measure_text(text, style, font_path, max_text_width, draw, line_spacing)
-        return h
-    elif node_type == 'text':
-        style = parent_style if parent_style else STYLE_MAP['paragraph']
-        h = measure_text(node.get('text', ''), style, font_path, max_text_width, draw, line_spacing)
-        return h
-    else:
-        total = 0
-        if 'children' in node:
-            for child in node['children']:
-                total += measure_node(child, x, y, draw, template, parent_style)
-        return total
+    # 与绘制共用同一套排版逻辑，测量结果就是实际绘制高度
+    _, h = layout_node(node, x, y, LayoutContext(template, draw), parent_style)
+    return h
 
 def paginate_ast_by_height(ast, template):
-    width, height = template.width, template.height
-    x = template.margins['left']
-    y = template.margins['top']
-    nav_height = 100
-    y_start = nav_height + 30
-    max_y = height - template.margins['bottom']
-    # 用于测量的虚拟画布
-    img = Image.new('RGB', (width, height), template.background_color)
-    draw = ImageDraw.Draw(img)
-    pages = []
-    current_page = []
-    current_y = y_start
-    for node in ast:
-        h = measure_node(node, x, current_y, draw, template)
-        if current_y + h > max_y and current_page:
-            pages.append(current_page)
-            current_page = []
-            current_y = y_start
-        current_page.append(node)
-        current_y += h
-    if current_page:
-        pages.append(current_page)
-    return pages
+    return [page.nodes for page in layout_pages(ast, template)]
 
-def render_ast_page(ast_nodes, template, output_path):
-    width, height = template.width, template.height
-    img = Image.new('RGB', (width, height), template.background_color)
-    draw = ImageDraw.Draw(img)
-    x = template.margins['left']
-    y = template.margins['top']
-    line_spacing = template.line_spacing
-    font_path = template.font_path
-    max_text_width = width - template.margins['left'] - template.margins['right']
-    # 顶部导航栏
-    nav_height = 100
-    nav_font = get_font(font_path, 38)
+def draw_items(img, draw, items, text_color='#000000'):
+    for item in items:
+        if isinstance(item, TextItem):
+            if item.color is None:
+                item = item._replace(color=text_color)
+            # 同一字体/文字的栅格结果（含模拟粗体的多次绘制）只生成一次，之后直接贴蒙版
+            TEXT_RUNS.draw(img, item)
+        elif isinstance(item, RectItem):
+            if item.outline:
+                draw.rectangle(list(item.box), outline=item.outline, width=item.width, fill=item.fill)
+            else:
+                draw_rounded_rectangle(draw, item.box, item.radius, fill=item.fill)
+        elif isinstance(item, LineItem):
+            draw.line(list(item.points), fill=item.fill, width=item.width)
+        elif isinstance(item, ImageItem):
+            try:
+                # 解码和缩放结果按 (路径, mtime, 尺寸) 缓存，JPEG 按目标尺寸 draft 解码
+                img.paste(IMAGE_CACHE.get(item.src, item.width, item.height), (int(item.x), int(item.y)))
+            except Exception as e:
+                pass
+
+# 导航栏图标只读取和缩放一次，进程内所有文档共用
+_ICON_CACHE = {}
+
+def load_icon(path, size=(48, 48)):
+    key = (path, size)
+    if key not in _ICON_CACHE:
+        stats.count('asset_opens')
+        try:
+            with Image.open(path) as icon:
+                _ICON_CACHE[key] = icon.convert('RGBA').resize(size)
+        except Exception as e:
+            _ICON_CACHE[key] = None
+    return _ICON_CACHE[key]
+
+def draw_chrome(img, draw, template, scale=1):
+    width = template.width * scale
+    x = template.margins['left'] * scale
+    def px(v):
+        return round(v * scale)
+    icon_size = (px(48), px(48))
+    # 顶部导航栏，字体和颜色取编译好的 nav 样式
+    nav = template.compiled.style('nav')
+    path, size, index = nav.spec
+    nav_font = FONT_REGISTRY.load(path, px(size), index)
     # 不绘制背景色
-    from PIL import Image as PILImage
     # 左侧返回icon
-    try:
-        icon_left = PILImage.open('assets/chevron.left@3x.png').convert('RGBA')
-        icon_left = icon_left.resize((48, 48))
-        img.paste(icon_left, (x, 32), icon_left)
-    except Exception as e:
-        pass
+    icon_left = load_icon('assets/chevron.left@3x.png', icon_size)
+    if icon_left:
+        img.paste(icon_left, (round(x), px(32)), icon_left)
     # 标题
-    draw.text((x+60, 32), '备忘录', font=nav_font, fill='#FFD60A')
+    draw.text((round(x) + px(60), px(32)), '备忘录', font=nav_font, fill=nav.color)
     # 右侧上传icon
-    try:
-        icon_upload = PILImage.open('assets/square.and.arrow.up@3x.png').convert('RGBA')
-        icon_upload = icon_upload.resize((48, 48))
-        img.paste(icon_upload, (width-x-120, 32), icon_upload)
-    except Exception as e:
-        pass
+    icon_upload = load_icon('assets/square.and.arrow.up@3x.png', icon_size)
+    if icon_upload:
+        img.paste(icon_upload, (round(width - x) - px(120), px(32)), icon_upload)
     # 右上角更多按钮
-    try:
-        icon_more = PILImage.open('assets/ellipsis.circle@3x.png').convert('RGBA')
-        icon_more = icon_more.resize((48, 48))
-        img.paste(icon_more, (width-x-40, 32), icon_more)
-    except Exception as e:
-        pass
-    y = nav_height + 30
-    def draw_text(text, style, x, y, bg=None, radius=0, pad_x=0, pad_y=0):
-        is_bold = style.get('bold', False)
-        font = get_font(font_path, style.get('font_size', template.font_size), 
-                       bold=is_bold, 
-                       italic=style.get('italic', False))
-        color = style.get('font_color', template.font_color)
-        lines = wrap_text(text, font, max_text_width if not bg else max_text_width-2*pad_x, draw)
-        total_height = 0
-        if bg:
-            h = 0
-            for line in lines:
-                bbox = font.getbbox(line)
-                h += bbox[3] - bbox[1]
-            h = h * line_spacing + 2*pad_y
-            draw_rounded_rectangle(draw, [x-pad_x, y-pad_y, x+max_text_width+pad_x, y+h], radius, fill=bg)
-        for line in lines:
-            # 如果是粗体但没有粗体字体，通过多次绘制模拟
-            draw.text((x, y), line, font=font, fill=color)
-            if is_bold and font == ImageFont.truetype(font_path, style.get('font_size', template.font_size)):
-                # 模拟粗体效果 - 轻微偏移多次绘制
-                draw.text((x+1, y), line, font=font, fill=color)
-                draw.text((x, y+1), line, font=font, fill=color)
-            bbox = font.getbbox(line)
-            h = bbox[3] - bbox[1]
-            y += h * line_spacing
-            total_height += h * line_spacing
-        return total_height
-    def render_node(node, x, y, parent_style=None):
-        node_type = node.get('type')
-        
-        # 打印节点信息，便于调试
-        if node_type in ['blockquote', 'block_quote']:
-            print(f"发现引用节点类型: {node_type}, 内容: {extract_text_from_ast(node)}")
-            node_type = 'blockquote'  # 统一为blockquote类型
-        
-        if node_type == 'heading':
-            level = node.get('level', 1)
-            style = STYLE_MAP['heading'].get(level, STYLE_MAP['heading'][1])
-            text = extract_text_from_ast(node.get('children', ''))
-            h = draw_text(text, style, x, y)
-            return y + h + 18
-        elif node_type == 'paragraph':
-            style = STYLE_MAP['paragraph']
-            text = extract_text_from_ast(node.get('children', ''))
-            h = draw_text(text, style, x, y)
-            return y + h
-        elif node_type == 'list':
-            style = STYLE_MAP['list']
-            for item in node.get('children', []):
-                text = '• ' + extract_text_from_ast(item.get('children', ''))
-                h = draw_text(text, style, x, y)
-                y += h
-            return y
-        elif node_type == 'blockquote':
-            print("正在渲染blockquote:", node)
-            style = STYLE_MAP['blockquote']
-            bg_color = style.get('bg_color', '#FFF3E0')
-            quote_x = x - 18
-            quote_y1 = y
-            
-            # 先测量引用内容的总高度
-            total_height = 0
-            temp_y = y
-            for child in node.get('children', []):
-                child_text = extract_text_from_ast(child.get('children', []))
-                if not child_text:
-                    child_text = extract_text_from_ast(child)
-                print("引用内容文本:", child_text)
-                font = get_font(font_path, style.get('font_size', template.font_size), 
-                               bold=style.get('bold', False), 
-                               italic=style.get('italic', False))
-                lines = wrap_text(child_text, font, max_text_width - 30, draw)
-                for line in lines:
-                    bbox = font.getbbox(line)
-                    h = bbox[3] - bbox[1]
-                    total_height += h * line_spacing
-            
-            # 如果高度太小，设置最小高度
-            if total_height < 50:
-                total_height = 50
-            
-            # 绘制背景和左侧边框
-            padding = 24
-            quote_bg_x1 = quote_x + 4
-            quote_bg_y1 = y - padding//2
-            quote_bg_x2 = x + max_text_width
-            quote_bg_y2 = y + total_height + padding//2
-            
-            # 绘制圆角背景
-            draw_rounded_rectangle(draw, [quote_bg_x1, quote_bg_y1, quote_bg_x2, quote_bg_y2], 
-                                 radius=16, fill=bg_color)
-            
-            # 绘制左侧橙色边框
-            quote_y2 = y + total_height + padding//2
-            draw.line([quote_x, quote_y1, quote_x, quote_y2], fill='#FFB300', width=8)
-            
-            # 渲染引用内容文本
-            original_y = y
-            for child in node.get('children', []):
-                child_text = extract_text_from_ast(child.get('children', []))
-                if not child_text:
-                    child_text = extract_text_from_ast(child)
-                if child_text:
-                    h = draw_text(child_text, style, x + 16, y)
-                    y += h
-            
-            # 确保即使无文本也返回合适高度
-            if y == original_y:
-                return original_y + total_height + padding
-            
-            return y + padding//2
-        elif node_type == 'thematic_break':
-            line_y = y + 18
-            draw.line([x, line_y, width-template.margins['right'], line_y], fill='#E5E5E5', width=6)
-            return line_y + 18
-        elif node_type == 'strong':
-            style = parent_style.copy() if parent_style else STYLE_MAP['paragraph'].copy()
-            style['bold'] = True
-            style['font_color'] = '#000000'  # 确保加粗文本颜色足够深
-            text = extract_text_from_ast(node.get('children', ''))
-            h = draw_text(text, style, x, y)
-            return y + h
-        elif node_type == 'emphasis':
-            style = parent_style.copy() if parent_style else {}
-            style['italic'] = True
-            text = extract_text_from_ast(node.get('children', ''))
-            h = draw_text(text, style, x, y)
-            return y + h
-        elif node_type == 'delete':
-            style = parent_style.copy() if parent_style else STYLE_MAP['paragraph'].copy()
-            text = extract_text_from_ast(node.get('children', ''))
-            h = draw_text(text, style, x, y)
-            # 画删除线
-            font = get_font(font_path, style.get('font_size', template.font_size))
-            bbox = font.getbbox(text)
-            mid_y = y + (bbox[3] - bbox[1]) // 2
-            draw.line([x, mid_y, x + bbox[2] - bbox[0], mid_y], fill='#888888', width=3)
-            return y + h
-        elif node_type == 'code':
-            # 代码块
-            code_text = node.get('raw', '')
-            code_font = get_font(font_path, 28)
-            code_bg = '#F5F5F5'
-            pad = 16
-            lines = code_text.split('\n')
-            h = 0
-            for line in lines:
-                bbox = code_font.getbbox(line)
-                h += bbox[3] - bbox[1] + 8
-            draw_rounded_rectangle(draw, [x-pad, y-pad, x+max_text_width+pad, y+h+pad], radius=12, fill=code_bg)
-            yy = y
-            for line in lines:
-                draw.text((x, yy), line, font=code_font, fill='#333333')
-                bbox = code_font.getbbox(line)
-                yy += bbox[3] - bbox[1] + 8
-            return y + h + 2*pad
-        elif node_type == 'inline_code':
-            # 行内代码
-            code_text = node.get('raw', '')
-            code_font = get_font(font_path, 28)
-            code_bg = '#F5F5F5'
-            pad = 6
-            bbox = code_font.getbbox(code_text)
-            h = bbox[3] - bbox[1]
-            w = bbox[2] - bbox[0]
-            draw_rounded_rectangle(draw, [x, y, x+w+2*pad, y+h+2*pad], radius=6, fill=code_bg)
-            draw.text((x+pad, y+pad), code_text, font=code_font, fill='#333333')
-            return y + h + 2*pad
-        elif node_type == 'link':
-            # 链接文本蓝色下划线
-            style = parent_style.copy() if parent_style else STYLE_MAP['paragraph'].copy()
-            style['font_color'] = '#1976D2'
-            text = extract_text_from_ast(node.get('children', ''))
-            h = draw_text(text, style, x, y)
-            font = get_font(font_path, style.get('font_size', template.font_size))
-            bbox = font.getbbox(text)
-            underline_y = y + bbox[3] - bbox[1]
-            draw.line([x, underline_y, x + bbox[2] - bbox[0], underline_y], fill='#1976D2', width=2)
-            return y + h
-        elif node_type == 'image':
-            # 简单插入图片（缩放到最大宽度）
-            from PIL import Image as PILImage
-            img_path = node.get('src') or node.get('url')
-            try:
-                pil_img = PILImage.open(img_path)
-                ratio = min(max_text_width / pil_img.width, 1.0)
-                new_w = int(pil_img.width * ratio)
-                new_h = int(pil_img.height * ratio)
-                pil_img = pil_img.resize((new_w, new_h))
-                img.paste(pil_img, (x, y))
-                return y + new_h + 10
-            except Exception as e:
-                h = draw_text('[图片加载失败]', STYLE_MAP['paragraph'], x, y)
-                return y + h
-        elif node_type == 'break':
-            return y + 12
-        elif node_type == 'table':
-            # 简单表格渲染
-            cell_pad = 12
-            row_h = 0
-            col_w = []
-            # 先计算最大列宽
-            for row in node.get('children', []):
-                for i, cell in enumerate(row.get('children', [])):
-                    text = extract_text_from_ast(cell.get('children', ''))
-                    font = get_font(font_path, 32)
-                    bbox = font.getbbox(text)
-                    w = bbox[2] - bbox[0]
-                    if len(col_w) <= i:
-                        col_w.append(w)
-                    else:
-                        col_w[i] = max(col_w[i], w)
-            # 渲染表格
-            yy = y
-            for row in node.get('children', []):
-                xx = x
-                row_h = 0
-                for i, cell in enumerate(row.get('children', [])):
-                    text = extract_text_from_ast(cell.get('children', ''))
-                    font = get_font(font_path, 32)
-                    bbox = font.getbbox(text)
-                    w = col_w[i] + 2*cell_pad
-                    h = bbox[3] - bbox[1] + 2*cell_pad
-                    draw.rectangle([xx, yy, xx+w, yy+h], outline='#CCCCCC', width=2, fill='#FAFAFA')
-                    draw.text((xx+cell_pad, yy+cell_pad), text, font=font, fill='#333333')
-                    xx += w
-                    row_h = max(row_h, h)
-                yy += row_h
-            return y + (yy - y)
-        else:
-            if 'children' in node:
-                for child in node['children']:
-                    y = render_node(child, x, y, parent_style)
-            return y
-    for node in ast_nodes:
-        y = render_node(node, x, y)
-    img.save(output_path)
+    icon_more = load_icon('assets/ellipsis.circle@3x.png', icon_size)
+    if icon_more:
+        img.paste(icon_more, (round(width - x) - px(40), px(32)), icon_more)
+
+def build_base_canvas(template, scale=1):
+    # 背景（纯色或图片）和导航栏合成一张底图
+    size = (round(template.width * scale), round(template.height * scale))
+    img = None
+    if template.background_image:
+        stats.count('asset_opens')
+        try:
+            with Image.open(template.background_image) as bg:
+                img = bg.convert('RGB').resize(size)
+        except Exception as e:
+            logger.warning("背景图片加载失败: %s: %s", template.background_image, e)
+    if img is None:
+        img = Image.new('RGB', size, template.background_color)
+    draw_chrome(img, ImageDraw.Draw(img), template, scale)
+    return img
+
+def base_canvas(template, scale=1):
+    # 每个模板每种缩放只合成一次，之后每页从副本开始绘制
+    canvas = template._base_canvases.get(scale)
+    if canvas is None:
+        canvas = template._base_canvases[scale] = build_base_canvas(template, scale)
+    return canvas
+
+def rasterize_items(items, template, scale=1):
+    # 只负责绘制排版好的显示列表；scale 不为 1 时按比例缩放后绘制
+    img = base_canvas(template, scale).copy()
+    draw = ImageDraw.Draw(img)
+    draw_items(img, draw, scale_items(items, scale), template.font_color)
+    return img
+
+def rasterize_page(page, template, scale=1):
+    return rasterize_items(page.items, template, scale)
+
+def render_layout_page(page, template, output_path):
+    rasterize_page(page, template).save(output_path)
+
+# 每个工作进程只加载一次模板和字体，按配置缓存，批量任务可复用同一个进程池
+_worker_templates = {}
+
+def _worker_template(config):
+    key = json.dumps(config, sort_keys=True)
+    tpl = _worker_templates.get(key)
+    if tpl is None:
+        tpl = _worker_templates[key] = Template(config)
+    return tpl
+
+def _init_render_worker(config):
+    _worker_template(config)
+
+def _render_page_task(config, items, output_path, output, page, scale=1):
+    with stats.stage('raster', page):
+        img = rasterize_items(items, _worker_template(config), scale)
+    return encode_to_file(img, output_path, OutputOptions.from_config(output), page)
+
+def _encode_page_task(config, items, output, page, scale=1):
+    # 绘制并在内存中编码，只把字节传回父进程
+    with stats.stage('raster', page):
+        img = rasterize_items(items, _worker_template(config), scale)
+    with stats.stage('encode', page):
+        return OutputOptions.from_config(output).encode(img)
+
+def _encode_worker_task(task):
+    # 返回 (字节, 统计快照或 None)
+    *args, collect = task
+    if not collect:
+        return _encode_page_task(*args), None
+    with stats.collect_stats() as collected:
+        data = _encode_page_task(*args)
+    return data, collected.snapshot()
+
+def _render_worker_task(task):
+    # 父进程开启了统计时，工作进程单独收集并随结果返回
+    *args, collect = task
+    if not collect:
+        return _render_page_task(*args)
+    with stats.collect_stats() as collected:
+        entry = _render_page_task(*args)
+    entry['stats'] = collected.snapshot()
+    return entry
+
+def resolve_jobs(jobs):
+    # jobs 为 0 或 None 时使用全部 CPU
+    if not jobs or jobs < 0:
+        return os.cpu_count() or 1
+    return jobs
+
+def create_render_pool(template, jobs):
+    from concurrent.futures import ProcessPoolExecutor
+    return ProcessPoolExecutor(max_workers=resolve_jobs(jobs), initializer=_init_render_worker,
+                               initargs=(template.config,))
+
+def render_pages(pages, template, output_dir, jobs=1, start=1, pool=None, options=None,
+                 encode_threads=2, report=None, cache=None, scales=None):
+    # 文件名按页序确定，与并行度无关；每页按 scales 中的每个比例各输出一张，分页完全相同
+    options = options or OutputOptions.from_config(template.output)
+    scales = scales or [1]
+    todo = [(index, scale, page, os.path.join(output_dir, options.filename(index, scale)))
+            for index, page in enumerate(pages, start) for scale in scales]
+    paths = [path for _, _, _, path in todo]
+    cached = []
+    keys = {}
+    if cache is not None:
+        # 命中缓存的页直接复制编码好的文件，不再绘制
+        misses = []
+        for index, scale, page, path in todo:
+            keys[path] = page_key(page.items, template, options, scale)
+            size = cache.fetch(keys[path], options.extension, path)
+            if size is None:
+                misses.append((index, scale, page, path))
+            else:
+                cached.append({'path': path, 'bytes': size, 'encode_ms': 0.0, 'cached': True,
+                               'page': index, 'scale': scale})
+        todo = misses
+    collect = stats.enabled()
+    tasks = [(template.config, page.items, path, options.to_config(), index, scale, collect)
+             for index, scale, page, path in todo]
+    workers = min(resolve_jobs(jobs), len(todo))
+    if not todo:
+        entries = []
+    elif pool is not None:
+        entries = list(pool.map(_render_worker_task, tasks))
+    elif workers <= 1:
+        # 编码在线程池中进行，和下一页的绘制重叠
+        with EncodePool(options, encode_threads) as encoder:
+            for index, scale, page, path in todo:
+                with stats.stage('raster', index):
+                    img = rasterize_page(page, template, scale)
+                encoder.submit(img, path, index)
+        entries = encoder.results()
+    else:
+        with create_render_pool(template, workers) as pool:
+            entries = list(pool.map(_render_worker_task, tasks))
+    for (index, scale, _, path), entry in zip(todo, entries):
+        stats.merge(entry.pop('stats', None))
+        entry['page'] = index
+        entry['scale'] = scale
+        if cache is not None:
+            cache.store(keys[path], options.extension, path)
+    if report is not None:
+        order = {path: i for i, path in enumerate(paths)}
+        report.extend(sorted(entries + cached, key=lambda e: order[e['path']]))
+    return paths
+
+def render_ast_page(ast_nodes, template, output_path):
+    # 不分页，所有节点依次排在同一页
+    page = Page()
+    y = CONTENT_TOP
+    for block in layout_ast(ast_nodes, template):
+        page.blocks.append((y, block))
+        y += block.height
+    render_layout_page(page, template, output_path)
 
 def render_markdown_to_image(md_text, template, output_path):
     # 兼容旧接口，直接渲染为单页图片（不分页）
-    md = mistune.create_markdown(renderer='ast')
-    ast = md(md_text)
-    render_ast_page(ast, template, output_path)
+    render_ast_page(parse(md_text, None), template, output_path)
+
+def parse_markdown(md_text, marker=None):
+    # 复用同一个解析器；缩进的引用行在解析时直接识别为引用，不再逐行预处理和遍历改写
+    return parse(md_text, marker)
+
+def layout_markdown(md_text, template):
+    return layout_pages(parse_markdown(md_text), template)
 
-def render_markdown_to_images(md_text, template, output_dir):
-    import os
-    
-    # 预处理Markdown文本，标准化blockquote格式
-    lines = md_text.split("\n")
-    processed_lines = []
-    
-    for line in lines:
-        if line.strip().startswith(">"):
-            # 确保标准blockquote格式
-            content = line.strip()[1:].strip()
-            processed_lines.append(f"> {content}")
-        else:
-            processed_lines.append(line)
-    
-    processed_md = "\n".join(processed_lines)
-    
-    md = mistune.create_markdown(renderer='ast')
-    ast = md(processed_md)
-    
-    # 手动检测并转换blockquote节点
-    def convert_blockquotes(nodes):
-        for i, node in enumerate(nodes):
-            if isinstance(node, dict):
-                if node.get('type') == 'paragraph':
-                    # 检查段落内容是否为blockquote
-                    text = extract_text_from_ast(node)
-                    if text.startswith(">"):
-                        # 创建新的blockquote节点
-                        content = text[1:].strip()
-                        nodes[i] = {
-                            'type': 'blockquote',
-                            'children': [{
-                                'type': 'paragraph',
-                                'children': [{
-                                    'type': 'text',
-                                    'raw': content
-                                }]
-                            }]
-                        }
-                        print(f"转换为blockquote: {content}")
-                # 递归处理子节点
-                if 'children' in node and isinstance(node['children'], list):
-                    convert_blockquotes(node['children'])
-    
-    # 应用转换
-    convert_blockquotes(ast)
-    
-    pages = paginate_ast_by_height(ast, template)
-    for i, page_nodes in enumerate(pages, 1):
-        out_path = os.path.join(output_dir, f'page_{i:02d}.png')
-        render_ast_page(page_nodes, template, out_path) 
\ No newline at end of file
+def render_markdown_to_images(md_text, template, output_dir, jobs=1, pool=None, **render_options):
+    pages = layout_markdown(md_text, template)
+    return render_pages(pages, template, output_dir, jobs, pool=pool, **render_options) 
\ No newline at end of file
@@ -0,0 +1,88 @@
+import threading
+from . import stats
+from .fonts import FONT_REGISTRY
+from .linebreak import glyph_advances, seed_advances
+
+
+class FontMetrics:
+    """只依赖字体本身的文字度量：字宽、ascent/descent、行高和墨迹高度，不分配任何画布。
+
+    横排文字整行墨迹的上下边界就是各字形上下边界的并集，所以逐字形缓存后，
+    测量一行的高度不需要再调用 getbbox。
+    传入 spec 和编译好的 ascent/descent 时，字体等到需要字宽或墨迹边界时才加载。
+    """
+
+    def __init__(self, font, spec=None, ascent=None, descent=None):
+        self._font = font
+        self.spec = spec
+        if ascent is None:
+            ascent, descent = font.getmetrics()
+        self.ascent, self.descent = ascent, descent
+        self.line_height = self.ascent + self.descent
+        # char -> (top, bottom)
+        self._extents = {}
+
+    @property
+    def font(self):
+        if self._font is None:
+            self._font = FONT_REGISTRY.load(*self.spec)
+        return self._font
+
+    def advances(self, text):
+        return glyph_advances(self.font, text)
+
+    def advance(self, text):
+        return sum(glyph_advances(self.font, text))
+
+    def extent(self, text):
+        # 整行墨迹的 (top, bottom)，与 font.getbbox(text) 的纵向结果一致
+        if not text:
+            return (0, 0)
+        extents = self._extents
+        top = bottom = None
+        for ch in text:
+            e = extents.get(ch)
+            if e is None:
+                stats.count('bbox_calls')
+                bbox = self.font.getbbox(ch)
+                e = extents[ch] = (bbox[1], bbox[3])
+            if top is None or e[0] < top:
+                top = e[0]
+            if bottom is None or e[1] > bottom:
+                bottom = e[1]
+        return (top, bottom)
+
+    def ink_height(self, text):
+        top, bottom = self.extent(text)
+        return bottom - top
+
+    def bbox(self, text):
+        # 需要左右边界（字距、左侧轴承）时才整体测量
+        stats.count('bbox_calls')
+        return self.font.getbbox(text)
+
+
+# 和 FONT_REGISTRY 同键，字体被淘汰时度量表一起丢弃，不会让已淘汰的字体一直留在内存里
+_METRICS = {}
+_lock = threading.Lock()
+FONT_REGISTRY.on_evict(lambda spec: _METRICS.pop(spec, None))
+
+
+def font_metrics(spec):
+    # spec 为 (path, size, index)，每个字体只建一份度量表
+    metrics = _METRICS.get(spec)
+    if metrics is None:
+        with _lock:
+            metrics = _METRICS.get(spec)
+            if metrics is None:
+                metrics = _METRICS[spec] = FontMetrics(FONT_REGISTRY.load(*spec), spec)
+    return metrics
+
+
+def seed_metrics(spec, ascent, descent, space_width=None):
+    # 用模板编译缓存中的度量预建度量表，不为了 getmetrics 打开字体
+    with _lock:
+        if spec not in _METRICS:
+            _METRICS[spec] = FontMetrics(None, spec, ascent, descent)
+    if space_width is not None:
+        seed_advances(spec, {' ': space_width})
@@ -0,0 +1,79 @@
+import re
+import threading
+import mistune
+
+DEFAULT_MARKER = '[[PAGE_BREAK]]'
+
+# 缩进 4 格以上的引用行，标准 Markdown 会当成缩进代码块，这里仍按引用处理
+LOOSE_QUOTE = r'^(?:[ \t]{4,}>[^\n]*(?:\n|$))+'
+
+
+def parse_loose_quote(block, m, state):
+    lines = [line.strip()[1:].strip() for line in m.group(0).splitlines()]
+    child = state.child_state('\n'.join(lines) + '\n')
+    block.parse(child, block.block_quote_rules)
+    state.append_token({'type': 'block_quote', 'children': child.tokens})
+    return m.end()
+
+
+def page_break_plugin(marker):
+    """单独成行的分页标记解析为 page_break 节点。
+
+    借用 thematic_break 规则注册：它能打断段落，也能结束引用和列表的懒惰续行，
+    和按文本切分时的行为一致。
+    """
+    pattern = r'^[ \t]*' + re.escape(marker) + r'[ \t]*$'
+    marker_re = re.compile(pattern)
+
+    def parse_break(block, m, state):
+        if marker_re.match(m.group(0)):
+            state.append_token({'type': 'page_break'})
+            return m.end() + 1
+        return block.parse_thematic_break(m, state)
+
+    def plugin(md):
+        original = md.block.specification['thematic_break']
+        md.block.register('thematic_break', f'(?:{pattern})|(?:{original})', parse_break)
+    return plugin
+
+
+def loose_quote_plugin(md):
+    md.block.register('loose_quote', LOOSE_QUOTE, parse_loose_quote, before='indent_code')
+
+
+def create_parser(marker=DEFAULT_MARKER):
+    plugins = ['table', loose_quote_plugin]
+    if marker:
+        plugins.append(page_break_plugin(marker))
+    return mistune.create_markdown(renderer='ast', plugins=plugins)
+
+
+# 解析器按分页标记缓存，整个进程复用，不再每段新建
+_PARSERS = {}
+_lock = threading.Lock()
+
+
+def get_parser(marker=DEFAULT_MARKER):
+    md = _PARSERS.get(marker)
+    if md is None:
+        with _lock:
+            md = _PARSERS.get(marker)
+            if md is None:
+                md = _PARSERS[marker] = create_parser(marker)
+    return md
+
+
+def parse(text, marker=DEFAULT_MARKER):
+    # 返回单个 AST，手动分页标记是其中的 page_break 节点
+    return get_parser(marker)(text)
+
+
+def split_pages(ast):
+    # 按 page_break 节点切分为多个区域，忽略只有空行的区域
+    segments = [[]]
+    for node in ast:
+        if node.get('type') == 'page_break':
+            segments.append([])
+        else:
+            segments[-1].append(node)
+    return [seg for seg in segments if any(node.get('type') != 'blank_line' for node in seg)]
@@ -0,0 +1,313 @@
+import io
+import json
+import os
+import contextvars
+import socketserver
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from .container import ArchiveWriter
+from .core import layout_document, output_options, open_cache
+from .encode import FORMATS
+from .cache import page_key
+from .markdown_render import base_canvas, create_render_pool, rasterize_page, resolve_jobs, _encode_worker_task
+from .templates import Template
+from . import stats
+from .stats import logger
+
+DEFAULT_TEMPLATE = 'default_template.json'
+
+# 请求体（Markdown 文本）大小上限，超过时返回 413
+DEFAULT_MAX_BODY = 16 * 1024 * 1024
+
+
+class QueueFull(Exception):
+    pass
+
+
+class TemplateNotFound(Exception):
+    pass
+
+
+class RenderService:
+    """常驻渲染服务：模板、字体和导航栏底图只加载一次，渲染进程池在请求间复用。
+
+    同时排队的请求数超过 max_queue 时直接拒绝（QueueFull），由调用方稍后重试；
+    请求体超过 max_body 字节时不读取，直接拒绝。
+    """
+
+    def __init__(self, templates_dir=None, jobs=1, max_queue=16, output=None, encode_threads=2,
+                 cache_dir=None, cache_bytes=None, default_template=None, max_body=DEFAULT_MAX_BODY):
+        self.templates_dir = templates_dir
+        self.max_body = max_body
+        self.default_template = default_template or DEFAULT_TEMPLATE
+        self.jobs = resolve_jobs(jobs)
+        self.max_queue = max_queue
+        self.output = output
+        self.encode_threads = encode_threads
+        self.cache = open_cache(cache_dir, cache_bytes)
+        self._templates = {}
+        self._template_lock = threading.Lock()
+        # 同时渲染的请求数等于进程数，其余请求排队等待
+        self._running = threading.Semaphore(self.jobs)
+        self._lock = threading.Lock()
+        self.accepted = 0
+        self.active = 0
+        self.completed = 0
+        self.rejected = 0
+        self.pool = None
+        self._pool_lock = threading.Lock()
+        # 请求在服务器新建的线程里处理，看不到启动服务时开启的统计，所以在这里记下收集器
+        self._collector = stats.current()
+        # 单进程时页面在请求线程绘制，编码交给共用的线程池
+        self._encoder = ThreadPoolExecutor(max_workers=encode_threads) if encode_threads > 0 else None
+        if templates_dir:
+            for name in sorted(os.listdir(templates_dir)):
+                if name.endswith('.json'):
+                    self.template(name[:-5])
+
+    def template_path(self, name):
+        if not name:
+            return self.default_template
+        # 只允许模板目录下的文件名，不接受路径
+        if not self.templates_dir or os.path.basename(name) != name:
+            raise TemplateNotFound(name)
+        path = os.path.join(self.templates_dir, name if name.endswith('.json') else name + '.json')
+        if not os.path.isfile(path):
+            raise TemplateNotFound(name)
+        return path
+
+    def template(self, name=None):
+        with self._template_lock:
+            tpl = self._templates.get(name)
+            if tpl is None:
+                tpl = Template.from_json(self.template_path(name))
+                base_canvas(tpl)
+                self._templates[name] = tpl
+                logger.info("已加载模板 %s", name or self.default_template)
+            return tpl
+
+    def render_pool(self, template):
+        # 进程池在第一次渲染时创建，工作进程按模板配置各自缓存模板
+        if self.jobs <= 1:
+            return None
+        with self._pool_lock:
+            if self.pool is None:
+                self.pool = create_render_pool(template, self.jobs)
+            return self.pool
+
+    def status(self):
+        with self._lock:
+            return {
+                'status': 'ok',
+                'workers': self.jobs,
+                'active': self.active,
+                'queue_depth': self.accepted - self.completed - self.active,
+                'max_queue': self.max_queue,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'templates': sorted(name or 'default' for name in self._templates),
+            }
+
+    def render(self, markdown, template=None, marker='[[PAGE_BREAK]]', output=None):
+        # 返回 [(文件名, 字节)]
+        return self._render(markdown, template, marker, output)[2]
+
+    def render_archive(self, fp, markdown, template=None, marker='[[PAGE_BREAK]]', output=None):
+        # 写成和 --container zip 相同的 zip（含 manifest.json），返回页数
+        tpl, options, files = self._render(markdown, template, marker, output)
+        writer = ArchiveWriter(fp, 'zip', options)
+        for name, data in files:
+            writer.add(data, tpl.width, tpl.height, name)
+        writer.close()
+        return len(files)
+
+    def _render(self, markdown, template, marker, output):
+        with self._lock:
+            if self.accepted - self.completed >= self.max_queue:
+                self.rejected += 1
+                raise QueueFull()
+            self.accepted += 1
+        try:
+            tpl = self.template(template)
+            options = output_options(tpl, dict(self.output or {}, **(output or {})))
+            with self._running:
+                with self._lock:
+                    self.active += 1
+                try:
+                    with stats.attach(self._collector):
+                        pages = layout_document(markdown, tpl, marker)
+                        return tpl, options, self._encode_pages(pages, tpl, options)
+                finally:
+                    with self._lock:
+                        self.active -= 1
+        finally:
+            with self._lock:
+                self.completed += 1
+
+    def _encode_pages(self, pages, tpl, options):
+        """每页在内存中绘制编码，返回 [(文件名, 字节)]，不经过临时文件。
+
+        命中渲染缓存的页直接取缓存的字节；多进程时工作进程只把编码好的字节传回来。
+        """
+        data = [None] * len(pages)
+        keys = {}
+        if self.cache is not None:
+            for i, page in enumerate(pages):
+                keys[i] = page_key(page.items, tpl, options)
+                data[i] = self.cache.read(keys[i], options.extension)
+        todo = [i for i, d in enumerate(data) if d is None]
+        pool = self.render_pool(tpl) if len(todo) > 1 else None
+        futures = []
+        for i in todo:
+            if pool is not None:
+                task = (tpl.config, pages[i].items, options.to_config(), i + 1, 1, stats.enabled())
+                futures.append((i, pool.submit(_encode_worker_task, task)))
+                continue
+            with stats.stage('raster', i + 1):
+                img = rasterize_page(pages[i], tpl)
+            if self._encoder is None:
+                with stats.stage('encode', i + 1):
+                    data[i] = options.encode(img)
+            else:
+                futures.append((i, self._encoder.submit(contextvars.copy_context().run, _encode, options, img, i + 1)))
+        for i, future in futures:
+            data[i], snapshot = future.result()
+            stats.merge(snapshot)
+        if self.cache is not None:
+            for i in todo:
+                self.cache.write(keys[i], options.extension, data[i])
+        return [(options.filename(i), d) for i, d in enumerate(data, 1)]
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+        if self._encoder is not None:
+            self._encoder.shutdown()
+
+
+def _encode(options, img, page):
+    with stats.stage('encode', page):
+        return options.encode(img), None
+
+
+class RenderHandler(BaseHTTPRequestHandler):
+    """GET /health 返回状态和队列深度；POST /render 请求体为 Markdown 文本，返回带 manifest.json 的 zip。
+
+    POST /render?template=名称&format=webp&quality=80&marker=...
+    缺少或非法的 Content-Length、format、quality 返回 400，请求体过大返回 413。
+    """
+    service = None
+
+    def address_string(self):
+        # Unix socket 没有客户端地址
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        logger.debug("%s %s", self.address_string(), format % args)
+
+    def send_json(self, code, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        if code == 503:
+            self.send_header('Retry-After', '1')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if urlparse(self.path).path in ('/health', '/healthz'):
+            self.send_json(200, self.service.status())
+        else:
+            self.send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != '/render':
+            self.send_json(404, {'error': 'not found'})
+            return
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        try:
+            length = self.headers.get('Content-Length')
+            if length is None:
+                raise ValueError('missing Content-Length')
+            length = int(length)
+            if length < 0:
+                raise ValueError(f'invalid Content-Length: {length}')
+            output = {}
+            if 'format' in query:
+                if query['format'] not in FORMATS:
+                    raise ValueError(f"unsupported format: {query['format']}")
+                output['format'] = query['format']
+            if 'quality' in query:
+                output['quality'] = int(query['quality'])
+                if not 0 <= output['quality'] <= 100:
+                    raise ValueError(f"quality out of range 0-100: {output['quality']}")
+        except ValueError as e:
+            # 请求体没有读，连接不能复用
+            self.close_connection = True
+            self.send_json(400, {'error': str(e)})
+            return
+        if length > self.service.max_body:
+            self.close_connection = True
+            self.send_json(413, {'error': f'body too large: {length} > {self.service.max_body} bytes'})
+            return
+        try:
+            markdown = self.rfile.read(length).decode('utf-8').replace('\r\n', '\n')
+        except UnicodeDecodeError as e:
+            self.send_json(400, {'error': str(e)})
+            return
+        try:
+            body = io.BytesIO()
+            count = self.service.render_archive(body, markdown, query.get('template'),
+                                                query.get('marker', '[[PAGE_BREAK]]'), output)
+        except QueueFull:
+            self.send_json(503, {'error': 'queue full', **self.service.status()})
+            return
+        except TemplateNotFound as e:
+            self.send_json(404, {'error': f'unknown template: {e}'})
+            return
+        except Exception as e:
+            logger.warning("渲染失败: %r", e)
+            self.send_json(500, {'error': repr(e)})
+            return
+        body = body.getvalue()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/zip')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('X-Pages', str(count))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        socketserver.UnixStreamServer.server_bind(self)
+        self.server_name = 'localhost'
+        self.server_port = 0
+
+
+def create_server(service, host='127.0.0.1', port=8765, socket_path=None):
+    handler = type('BoundRenderHandler', (RenderHandler,), {'service': service})
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        return ThreadingUnixHTTPServer(socket_path, handler)
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def serve(host='127.0.0.1', port=8765, socket_path=None, **service_options):
+    service = RenderService(**service_options)
+    server = create_server(service, host, port, socket_path)
+    logger.info("md2card 服务已启动: %s", socket_path or f'http://{host}:{server.server_port}')
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        service.close()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
@@ -0,0 +1,164 @@
+import contextvars
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+
+# 调试输出统一走 logging，命令行用 -v/-q 控制
+logger = logging.getLogger('md2card')
+
+STAGES = ['load', 'parse', 'layout', 'paginate', 'raster', 'encode']
+
+
+class Stats:
+    # 一次收集期间的阶段耗时、逐页耗时和热点计数
+    def __init__(self):
+        self.stages = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.pages = defaultdict(lambda: defaultdict(float))
+        self.counters = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def add_time(self, stage, seconds, page=None):
+        with self._lock:
+            self.stages[stage] += seconds
+            self.calls[stage] += 1
+            if page is not None:
+                self.pages[page][stage] += seconds
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    def merge(self, snapshot):
+        # 合并另一份 snapshot（例如工作进程返回的统计）
+        with self._lock:
+            for stage, data in snapshot.get('stages', {}).items():
+                self.stages[stage] += data['ms'] / 1000
+                self.calls[stage] += data['calls']
+            for page, stages in snapshot.get('pages', {}).items():
+                for stage, ms in stages.items():
+                    self.pages[int(page)][stage] += ms / 1000
+            for name, n in snapshot.get('counters', {}).items():
+                self.counters[name] += n
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'stages': {stage: {'ms': self.stages[stage] * 1000, 'calls': self.calls[stage]}
+                           for stage in self.stages},
+                'pages': {page: {stage: s * 1000 for stage, s in stages.items()}
+                          for page, stages in sorted(self.pages.items())},
+                'counters': dict(self.counters),
+            }
+
+
+# 当前收集器，按上下文（线程 / asyncio 任务）区分；为 None 时所有埋点都只是一次查找
+_active = contextvars.ContextVar('md2card_stats', default=None)
+
+
+def enabled():
+    return _active.get() is not None
+
+
+def count(name, n=1):
+    stats = _active.get()
+    if stats is not None:
+        stats.count(name, n)
+
+
+def add_time(stage, seconds, page=None):
+    stats = _active.get()
+    if stats is not None:
+        stats.add_time(stage, seconds, page)
+
+
+class _StageTimer:
+    __slots__ = ('stats', 'name', 'page', 'started')
+
+    def __init__(self, stats, name, page):
+        self.stats = stats
+        self.name = name
+        self.page = page
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.stats.add_time(self.name, time.perf_counter() - self.started, self.page)
+
+
+_NULL_TIMER = nullcontext()
+
+
+def stage(name, page=None):
+    stats = _active.get()
+    if stats is None:
+        return _NULL_TIMER
+    return _StageTimer(stats, name, page)
+
+
+def merge(snapshot):
+    stats = _active.get()
+    if stats is not None and snapshot:
+        stats.merge(snapshot)
+
+
+def current():
+    # 当前上下文的收集器，没有开启统计时为 None
+    return _active.get()
+
+
+@contextmanager
+def attach(collector):
+    """在另一个线程里把统计记到已有的收集器上，例如常驻服务为每个请求新建的处理线程。
+
+    collector 为 None 时什么也不做。
+    """
+    if collector is None:
+        yield None
+        return
+    token = _active.set(collector)
+    try:
+        yield collector
+    finally:
+        _active.reset(token)
+
+
+@contextmanager
+def collect_stats(callback=None):
+    """在 with 块内开启统计，结束时把 snapshot 传给 callback（可用于转发到监控系统）。
+
+    统计只对当前线程或 asyncio 任务生效，不同线程里的收集互不影响；
+    嵌套使用时内层结果会合并到外层。交给线程池的任务用 copy_context().run 提交才能计入。
+    """
+    previous = _active.get()
+    stats = Stats()
+    token = _active.set(stats)
+    try:
+        yield stats
+    finally:
+        _active.reset(token)
+        snapshot = stats.snapshot()
+        if previous is not None:
+            previous.merge(snapshot)
+        if callback is not None:
+            callback(snapshot)
+
+
+def format_stats(snapshot, fmt='text'):
+    if fmt == 'json':
+        return json.dumps(snapshot, ensure_ascii=False, indent=2)
+    lines = []
+    for stage in STAGES + sorted(set(snapshot['stages']) - set(STAGES)):
+        data = snapshot['stages'].get(stage)
+        if data:
+            lines.append(f"{stage:<9} {data['ms']:10.1f} ms  ({data['calls']} calls)")
+    for page, stages in snapshot['pages'].items():
+        lines.append(f"page {page:>3}: " + ', '.join(f"{s}={ms:.1f}ms" for s, ms in stages.items()))
+    for name, n in sorted(snapshot['counters'].items()):
+        lines.append(f"{name:<16} {n}")
+    return '\n'.join(lines)
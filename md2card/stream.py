@@ -0,0 +1,146 @@
+import os
+import re
+from collections import deque
+from .container import container_filename, write_container
+from .core import load_template, output_options
+from .encode import EncodePool
+from .layout import LayoutContext, layout_block, iter_pages
+from .markdown_render import rasterize_page, create_render_pool, resolve_jobs, _render_worker_task
+from .parser import parse
+from . import stats
+from .stats import logger
+
+FENCES = ('```', '~~~')
+LIST_ITEM = re.compile(r'(?:[-+*]|\d{1,9}[.)])(?:[ \t]|$)')
+
+
+def _continues_block(line):
+    # 空行之后仍可能属于上一个块的行：缩进行（列表项续行、缩进代码）和列表项标记（松散列表的下一项）
+    return line[:1] in (' ', '\t') or LIST_ITEM.match(line) is not None
+
+
+def iter_chunks(f, marker='[[PAGE_BREAK]]', chunk_chars=64 * 1024):
+    """按块边界分段读取：攒够 chunk_chars 后，在代码块之外的分页标记处，
+    或者在空行之后紧跟顶格、且不是列表项的行之前切开。
+
+    空行后的缩进行和列表项可能还是松散列表的一部分，不在这里切，
+    所以列表和缩进续行不会被拆到两段里；分段解析和整篇解析得到的块序列相同
+    （跨段的引用式链接定义除外）。
+    """
+    lines = []
+    size = 0
+    fence = None
+    # 攒够长度后遇到空行，等看到下一个非空行再决定是否切开
+    pending = False
+    for line in f:
+        stripped = line.strip()
+        if pending and stripped:
+            pending = False
+            if not _continues_block(line):
+                yield ''.join(lines)
+                lines = []
+                size = 0
+        lines.append(line)
+        size += len(line)
+        if fence is not None:
+            if stripped.startswith(fence):
+                fence = None
+            continue
+        if stripped.startswith(FENCES):
+            fence = stripped[:3]
+            continue
+        if size < chunk_chars:
+            continue
+        if stripped == marker:
+            yield ''.join(lines)
+            lines = []
+            size = 0
+        elif not stripped:
+            pending = True
+    if lines:
+        yield ''.join(lines)
+
+
+def iter_stream_pages(f, template, marker='[[PAGE_BREAK]]', chunk_chars=64 * 1024):
+    # 逐段解析、排版，页面一满就产出；不保留已产出页面的任何引用
+    ctx = LayoutContext(template)
+
+    def entries():
+        # 分页标记本身不占位置，只让下一个块从新页开始
+        forced = False
+        for chunk in iter_chunks(f, marker, chunk_chars):
+            with stats.stage('parse'):
+                ast = parse(chunk, marker)
+            for node in ast:
+                if node.get('type') == 'page_break':
+                    forced = True
+                    continue
+                with stats.stage('layout'):
+                    block = layout_block(node, ctx)
+                yield block, forced
+                forced = False
+            del ast
+
+    for page, _ in iter_pages(entries(), template):
+        # 只有空行的区域不单独成页，和 split_pages 一致
+        if any(block.node.get('type') != 'blank_line' for _, block in page.blocks):
+            yield page
+
+
+def generate_cards_streaming(input_path, output_dir, template_path=None, marker='[[PAGE_BREAK]]', jobs=1,
+                             output=None, encode_threads=2, chunk_chars=64 * 1024, report=None, container=None):
+    """流式生成：内存占用与文档长度无关，适合上千页的长文档。
+
+    指定 container 时页面边排版边追加到同一个容器文件，返回 [容器路径]。
+    """
+    tpl = load_template(template_path)
+    options = output_options(tpl, output)
+    os.makedirs(output_dir, exist_ok=True)
+    workers = resolve_jobs(jobs)
+    paths = []
+    collect = stats.enabled()
+    with open(input_path, 'r', encoding='utf-8') as f:
+        pages = iter_stream_pages(f, tpl, marker, chunk_chars)
+        if container:
+            name = os.path.splitext(os.path.basename(input_path))[0]
+            path = os.path.join(output_dir, container_filename(name, container))
+            write_container(pages, tpl, path, container, options, jobs, encode_threads=encode_threads, report=report)
+            return [path]
+        if workers > 1:
+            # 最多 2*workers 页在途，排版和绘制同时进行
+            entries = []
+            pending = deque()
+            with create_render_pool(tpl, workers) as pool:
+                for index, page in enumerate(pages, 1):
+                    path = os.path.join(output_dir, options.filename(index))
+                    task = (tpl.config, page.items, path, options.to_config(), index, 1, collect)
+                    pending.append((index, pool.submit(_render_worker_task, task)))
+                    paths.append(path)
+                    while len(pending) >= 2 * workers:
+                        entries.append(_finish(*pending.popleft()))
+                while pending:
+                    entries.append(_finish(*pending.popleft()))
+        else:
+            with EncodePool(options, encode_threads) as encoder:
+                for index, page in enumerate(pages, 1):
+                    path = os.path.join(output_dir, options.filename(index))
+                    with stats.stage('raster', index):
+                        img = rasterize_page(page, tpl)
+                    # 提交后不再持有页面和图片，编码完成即释放
+                    encoder.submit(img, path, index)
+                    del img, page
+                    paths.append(path)
+            entries = encoder.results()
+            for index, entry in enumerate(entries, 1):
+                entry['page'] = index
+    logger.info("流式生成 %d 页", len(paths))
+    if report is not None:
+        report.extend(entries)
+    return paths
+
+
+def _finish(index, future):
+    entry = future.result()
+    stats.merge(entry.pop('stats', None))
+    entry['page'] = index
+    return entry
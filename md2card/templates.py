@@ -1,8 +1,10 @@
 import json
-from PIL import Image, ImageDraw, ImageFont
+from .fonts import FONT_REGISTRY
 
 class Template:
     def __init__(self, config):
+        # 保留原始配置，用于在工作进程中重建模板
+        self.config = dict(config)
         self.width = config.get('width', 1080)
         self.height = config.get('height', 1920)
         self.background_color = config.get('background_color', '#FFFFFF')
@@ -12,7 +14,26 @@ class Template:
         self.font_color = config.get('font_color', '#000000')
         self.line_spacing = config.get('line_spacing', 1.5)
         self.margins = config.get('margins', {'top':100,'bottom':100,'left':100,'right':100})
-        self.font = ImageFont.truetype(self.font_path, self.font_size)
+        # 断行方式：char 逐字符，word 英文按单词、中文按字并避头尾
+        self.word_break = config.get('word_break', 'char')
+        # 输出编码参数，见 encode.OutputOptions
+        self.output = config.get('output', {})
+        # 背景和导航栏底图，按缩放比例在首次渲染时合成
+        self._base_canvases = {}
+        self._compiled = None
+
+    @property
+    def font(self):
+        # 渲染不需要正文默认字体，用到时才加载
+        return FONT_REGISTRY.load(self.font_path, self.font_size)
+
+    @property
+    def compiled(self):
+        # 各样式的字体和度量，首次排版时编译（优先读磁盘缓存）
+        if self._compiled is None:
+            from .compiled import compile_template
+            self._compiled = compile_template(self)
+        return self._compiled
 
     @classmethod
     def from_json(cls, path):
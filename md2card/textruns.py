@@ -0,0 +1,106 @@
+import math
+import threading
+from collections import OrderedDict
+from PIL import Image, ImageDraw
+from . import stats
+from .fonts import FONT_REGISTRY
+
+
+# 水平方向亚像素定位的精度：x 取整到 1/4 像素，y 取整到整像素
+SUBPIXEL = 4
+
+
+def snap(x, y):
+    return round(x * SUBPIXEL) / SUBPIXEL, float(round(y))
+
+
+class TextRunCache:
+    """已栅格化文字串的缓存：(font, fake_bold, text, 亚像素偏移) -> (灰度蒙版, 偏移)。
+
+    蒙版与颜色无关，绘制时用 paste(color, box, mask) 上色，同一段文字换颜色也能命中；
+    按蒙版像素总量做 LRU 淘汰。行距系数让行的 y 坐标几乎都带小数，
+    所以绘制位置 y 取整像素、x 取 1/SUBPIXEL 像素，每段文字最多 SUBPIXEL 种蒙版。
+    """
+
+    def __init__(self, max_pixels=16 * 1024 * 1024):
+        self.max_pixels = max_pixels
+        self._runs = OrderedDict()
+        self._pixels = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, font_spec, text, fake_bold, x, y):
+        # 返回 (mask, (left, top))，mask 贴到 snap(x, y) 的整数部分加 (left, top)
+        x, y = snap(x, y)
+        fx, fy = x % 1, y % 1
+        key = (font_spec, fake_bold, text, fx, fy)
+        with self._lock:
+            run = self._runs.get(key)
+            if run is not None:
+                self._runs.move_to_end(key)
+                self.hits += 1
+                stats.count('text_run_hits')
+                return run
+            self.misses += 1
+        stats.count('text_run_misses')
+        run = self._render(font_spec, text, fake_bold, fx, fy)
+        pixels = run[0].width * run[0].height
+        with self._lock:
+            if key not in self._runs and pixels <= self.max_pixels:
+                self._runs[key] = run
+                self._pixels += pixels
+                while self._pixels > self.max_pixels:
+                    _, (old, _) = self._runs.popitem(last=False)
+                    self._pixels -= old.width * old.height
+                    self.evictions += 1
+        return run
+
+    def _render(self, font_spec, text, fake_bold, fx, fy):
+        font = FONT_REGISTRY.load(*font_spec)
+        left, top, right, bottom = font.getbbox(text)
+        # 四周各留一像素给亚像素偏移，模拟粗体再向右下多留一像素；
+        # 绘制原点不能为负（负坐标的小数部分会让 FreeType 的亚像素定位和直接绘制不一致）
+        left, top = min(math.floor(left) - 1, 0), min(math.floor(top) - 1, 0)
+        extra = 2 if fake_bold else 1
+        size = (max(1, math.ceil(right) - left + extra), max(1, math.ceil(bottom) - top + extra))
+        mask = Image.new('L', size, 0)
+        draw = ImageDraw.Draw(mask)
+        origin = (fx - left, fy - top)
+        draw.text(origin, text, font=font, fill=255)
+        if fake_bold:
+            draw.text((origin[0] + 1, origin[1]), text, font=font, fill=255)
+            draw.text((origin[0], origin[1] + 1), text, font=font, fill=255)
+        return mask, (left, top)
+
+    def draw(self, img, item):
+        mask, (left, top) = self.get(item.font, item.text, item.fake_bold, item.x, item.y)
+        x, y = snap(item.x, item.y)
+        img.paste(item.color, (math.floor(x) + left, math.floor(y) + top), mask)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / total if total else 0.0,
+                'size': len(self._runs),
+                'pixels': self._pixels,
+                'max_pixels': self.max_pixels,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._runs.clear()
+            self._pixels = 0
+            self.hits = self.misses = self.evictions = 0
+
+
+TEXT_RUNS = TextRunCache()
+
+
+def text_run_stats():
+    return TEXT_RUNS.stats()
@@ -1,7 +1,8 @@
 import re
+from .stats import logger
 
 def load_text(path):
-    print(f"DEBUG: Reading file: {path}")
+    logger.debug("Reading file: %s", path)
     with open(path, 'r', encoding='utf-8') as f:
         text = f.read()
     return text.replace('\r\n', '\n').replace('\r', '\n')
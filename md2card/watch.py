@@ -0,0 +1,139 @@
+import hashlib
+import json
+import os
+import time
+from .core import load_template, parse_document, output_options
+from .encode import OutputOptions, EncodePool
+from .layout import LayoutContext, layout_block, iter_pages
+from .markdown_render import rasterize_page
+from .utils import load_text
+from . import stats
+from .stats import logger
+
+
+def block_key(node):
+    # 块内容的指纹，内容不变的块直接复用上次的排版结果
+    return hashlib.sha1(json.dumps(node, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def page_signature(page):
+    return hashlib.sha1(repr(page.items).encode('utf-8')).hexdigest()
+
+
+class IncrementalRenderer:
+    """常驻进程中的增量渲染：只重新排版变化的块，从第一个受影响的页开始重新分页，
+    只重写内容确实变化的 page_NN 文件。"""
+
+    def __init__(self, template, output_dir, marker='[[PAGE_BREAK]]', options=None, encode_threads=2):
+        self.template = template
+        self.output_dir = output_dir
+        self.marker = marker
+        self.options = options or OutputOptions.from_config(template.output)
+        self.encode_threads = encode_threads
+        self.ctx = LayoutContext(template)
+        self.blocks = {}       # block_key -> Block
+        self.entries = []      # [(block_key, page_break_before)]
+        self.pages = []        # [Page]
+        self.page_ranges = []  # 每页包含的 entries 下标范围 (start, end)
+        self.signatures = []   # 每页内容指纹
+
+    def _entries(self, text):
+        entries = []
+        for i, ast in enumerate(parse_document(text, self.marker)):
+            for j, node in enumerate(ast):
+                key = block_key(node)
+                if key not in self.blocks:
+                    self.blocks[key] = layout_block(node, self.ctx)
+                # 手动分页区域的第一个块强制换页
+                entries.append((key, i > 0 and j == 0))
+        return entries
+
+    def _paginate(self, entries, start_page, start_entry):
+        # 前 start_page 页原样保留，从 start_entry 个块开始重新分页
+        pages = self.pages[:start_page]
+        ranges = self.page_ranges[:start_page]
+        blocks = ((self.blocks[key], forced) for key, forced in entries[start_entry:])
+        for page, span in iter_pages(blocks, self.template, start_entry):
+            pages.append(page)
+            ranges.append(span)
+        return pages, ranges
+
+    def update(self, text):
+        # 返回本次重写的页码列表
+        with stats.stage('layout'):
+            entries = self._entries(text)
+        # 找到第一个变化的块，它之前的页原样保留
+        first_changed = 0
+        while (first_changed < len(entries) and first_changed < len(self.entries)
+               and entries[first_changed] == self.entries[first_changed]):
+            first_changed += 1
+        if first_changed == len(entries) == len(self.entries):
+            return []
+        # 变化块所在的页要重排；它前一页末尾若有空位也可能吸收变化后的块，所以 end == first_changed 的页也算受影响
+        start_page = max(len(self.page_ranges) - 1, 0)
+        for page_index, (start, end) in enumerate(self.page_ranges):
+            if end >= first_changed:
+                start_page = page_index
+                break
+        # 从拆分块的续页开始会丢掉它前半部分，退回到该块第一次出现的页
+        while start_page > 0 and self.page_ranges[start_page - 1][1] > self.page_ranges[start_page][0]:
+            start_page -= 1
+        start_entry = self.page_ranges[start_page][0] if self.page_ranges else 0
+        with stats.stage('paginate'):
+            pages, ranges = self._paginate(entries, start_page, start_entry)
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        signatures = self.signatures[:start_page]
+        written = []
+        with EncodePool(self.options, self.encode_threads) as encoder:
+            for index in range(start_page, len(pages)):
+                sig = page_signature(pages[index])
+                signatures.append(sig)
+                if index < len(self.signatures) and self.signatures[index] == sig:
+                    continue
+                path = os.path.join(self.output_dir, self.options.filename(index + 1))
+                with stats.stage('raster', index + 1):
+                    img = rasterize_page(pages[index], self.template)
+                encoder.submit(img, path, index + 1)
+                written.append(index + 1)
+        # 页数变少时删除多余的旧文件
+        for index in range(len(pages), len(self.pages)):
+            path = os.path.join(self.output_dir, self.options.filename(index + 1))
+            if os.path.exists(path):
+                os.remove(path)
+
+        self.entries = entries
+        self.pages = pages
+        self.page_ranges = ranges
+        self.signatures = signatures
+        # 只保留当前文档用到的块，避免缓存无限增长
+        live = {key for key, _ in entries}
+        self.blocks = {key: block for key, block in self.blocks.items() if key in live}
+        return written
+
+
+def watch(input_path, output_dir, template_path=None, marker='[[PAGE_BREAK]]', interval=0.3,
+          output=None, encode_threads=2, callback=None):
+    # 轮询文件修改时间，变化后增量更新；Ctrl-C 退出
+    tpl = load_template(template_path)
+    renderer = IncrementalRenderer(tpl, output_dir, marker,
+                                   output_options(tpl, output), encode_threads)
+    last_mtime = None
+    while True:
+        try:
+            mtime = os.stat(input_path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime is not None and mtime != last_mtime:
+            last_mtime = mtime
+            started = time.perf_counter()
+            try:
+                written = renderer.update(load_text(input_path))
+            except Exception as e:
+                logger.warning("渲染失败: %r", e)
+            else:
+                elapsed = (time.perf_counter() - started) * 1000
+                logger.info("共 %d 页，更新 %s，用时 %.0f ms", len(renderer.pages), written or '无', elapsed)
+                if callback is not None:
+                    callback(written)
+        time.sleep(interval)
@@ -0,0 +1,33 @@
+import json
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# 测试使用仓库自带的 Aileron 字体（CC0），不依赖系统字体；模板编译缓存不写到用户目录
+FONT = os.path.join(ROOT, 'benchmarks', 'fonts', 'Aileron-Regular.ttf')
+os.environ['MD2CARD_TEMPLATE_CACHE'] = ''
+
+
+def template_config(**overrides):
+    with open(os.path.join(ROOT, 'default_template.json'), 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    config['font_path'] = FONT
+    config.update(overrides)
+    return config
+
+
+@pytest.fixture
+def template():
+    from md2card.templates import Template
+    return Template(template_config())
+
+
+@pytest.fixture
+def template_path(tmp_path):
+    path = tmp_path / 'template.json'
+    path.write_text(json.dumps(template_config()), encoding='utf-8')
+    return str(path)
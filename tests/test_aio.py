@@ -0,0 +1,74 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pytest
+
+from md2card import aio
+from md2card.aio import AsyncRenderer
+from md2card.core import iter_cards
+
+PAGES = 8
+DOC = '\n\n[[PAGE_BREAK]]\n\n'.join(f'# Page {i}\n\nSome text on page {i}.' for i in range(PAGES))
+
+
+class CountingExecutor(ThreadPoolExecutor):
+    # 记录提交了多少个绘制任务
+    def __init__(self):
+        super().__init__(2)
+        self.cards = 0
+
+    def submit(self, fn, *args, **kwargs):
+        if fn is aio._card_task:
+            self.cards += 1
+        return super().submit(fn, *args, **kwargs)
+
+
+def test_cancel_stops_rendering_and_releases_semaphore(template):
+    async def main():
+        renderer = AsyncRenderer(CountingExecutor(), max_concurrent=1, prefetch=2)
+        first = asyncio.Event()
+
+        async def consume():
+            async for _ in renderer.iter_cards(DOC, template):
+                first.set()
+                await asyncio.sleep(10)
+
+        task = asyncio.create_task(consume())
+        await first.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        submitted = renderer.executor.cards
+        assert submitted < PAGES
+        # 信号量已释放，同一个渲染器还能继续渲染；取消的文档不再提交新页
+        cards = await asyncio.wait_for(renderer.render_cards('# again', template), 10)
+        assert len(cards) == 1
+        assert renderer.executor.cards == submitted + 1
+        await renderer.aclose()
+
+    asyncio.run(main())
+
+
+def test_aclose_shuts_down_executor(template):
+    async def main():
+        executor = ThreadPoolExecutor(1)
+        async with AsyncRenderer(executor) as renderer:
+            assert len(await renderer.render_cards('# one', template)) == 1
+        with pytest.raises(RuntimeError):
+            executor.submit(print)
+
+    asyncio.run(main())
+
+
+def test_process_pool_matches_sync_api(template):
+    async def main():
+        async with AsyncRenderer(ProcessPoolExecutor(2)) as renderer:
+            return await renderer.render_cards(DOC, template, encode='png')
+
+    cards = asyncio.run(main())
+    expected = list(iter_cards(DOC, template, encode='png'))
+    assert len(cards) == len(expected) == PAGES
+    for card, want in zip(cards, expected):
+        assert card.index == want.index
+        assert card.image.tobytes() == want.image.tobytes()
+        assert card.data == want.data
@@ -0,0 +1,24 @@
+from md2card.core import generate_cards_batch, iter_batch_inputs
+
+
+def test_bad_manifest_lines_become_error_records(tmp_path):
+    manifest = tmp_path / 'manifest.jsonl'
+    manifest.write_text('{"input": "a.md"}\nnot json\n{"output": "x"}\n[1]\n', encoding='utf-8')
+    jobs = list(iter_batch_inputs(str(manifest), str(tmp_path / 'out')))
+    assert jobs[0]['input'] == str(tmp_path / 'a.md')
+    assert 'error' not in jobs[0]
+    assert [job['input'] for job in jobs[1:]] == [f'{manifest}:{n}' for n in (2, 3, 4)]
+    assert all('error' in job for job in jobs[1:])
+
+
+def test_batch_counts_pages_not_files(tmp_path, template_path):
+    source = tmp_path / 'src'
+    source.mkdir()
+    (source / 'a.md').write_text('# A\n\none\n\n[[PAGE_BREAK]]\n\ntwo\n', encoding='utf-8')
+    manifest = tmp_path / 'manifest.jsonl'
+    manifest.write_text('{"input": "src/a.md"}\n{"output": "x"}\n', encoding='utf-8')
+    summary = generate_cards_batch(str(manifest), str(tmp_path / 'out'), template_path, scales=[1, 2])
+    assert summary['documents'] == 2
+    assert summary['failed'] == 1
+    assert summary['pages'] == 2
+    assert summary['results'][0]['files'] == 4
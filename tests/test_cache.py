@@ -0,0 +1,63 @@
+import multiprocessing
+import os
+
+from md2card.cache import RenderCache
+from md2card.core import open_cache
+
+ENTRY_BYTES = 1000
+
+
+def entry_files(directory):
+    # 缓存条目，不含 .lock、.size 等记账文件
+    return [os.path.join(root, name) for root, _, files in os.walk(directory)
+            for name in files if not name.startswith('.')]
+
+
+def cache_bytes(directory):
+    return sum(os.path.getsize(path) for path in entry_files(directory))
+
+
+def store_entries(directory, max_bytes, prefix, count):
+    cache = RenderCache(directory, max_bytes)
+    src = os.path.join(directory, f'.src-{prefix}')
+    with open(src, 'wb') as f:
+        f.write(b'x' * ENTRY_BYTES)
+    for i in range(count):
+        cache.store(f'{prefix}{i:04d}', 'png', src)
+    os.remove(src)
+
+
+def test_overwrite_does_not_double_count(tmp_path):
+    cache = RenderCache(str(tmp_path), 10 * ENTRY_BYTES)
+    src = tmp_path / 'page.png'
+    src.write_bytes(b'x' * ENTRY_BYTES)
+    for _ in range(20):
+        cache.store('ab12', 'png', str(src))
+    assert cache._size == ENTRY_BYTES
+    assert cache.fetch('ab12', 'png', str(tmp_path / 'out.png')) == ENTRY_BYTES
+
+
+def test_concurrent_writers_stay_under_limit(tmp_path):
+    directory = str(tmp_path / 'cache')
+    max_bytes = 20 * ENTRY_BYTES
+    ctx = multiprocessing.get_context('fork')
+    workers = [ctx.Process(target=store_entries, args=(directory, max_bytes, prefix, 60)) for prefix in 'ab']
+    os.makedirs(directory)
+    for p in workers:
+        p.start()
+    for p in workers:
+        p.join()
+        assert p.exitcode == 0
+    assert cache_bytes(directory) <= max_bytes
+    # 淘汰后重新打开，统计的大小和磁盘一致，留下的条目都能完整命中
+    cache = RenderCache(directory, max_bytes)
+    assert cache._size == cache_bytes(directory)
+    keys = [os.path.splitext(os.path.basename(path))[0] for path in entry_files(directory)]
+    assert keys
+    for key in keys:
+        assert cache.fetch(key, 'png', str(tmp_path / 'out.png')) == ENTRY_BYTES
+
+
+def test_open_cache_respects_zero_limit(tmp_path):
+    assert open_cache(str(tmp_path), 0).max_bytes == 0
+    assert open_cache(None) is None
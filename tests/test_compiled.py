@@ -0,0 +1,55 @@
+import json
+import os
+
+import pytest
+
+from md2card import compiled
+from md2card.compiled import _cache_path, compile_template
+from md2card.fonts import FONT_REGISTRY
+from md2card.metrics import font_metrics
+from md2card.templates import Template
+
+
+def test_cache_round_trip(template, tmp_path):
+    first = compile_template(template, str(tmp_path))
+    second = compile_template(template, str(tmp_path))
+    assert second.specs == first.specs
+    assert second.resolved == first.resolved
+
+
+@pytest.mark.parametrize('content', ['[]', '{"version": 2, "probes": {}, "styles": 1}', '{"version": 2',
+                                     'null'])
+def test_malformed_cache_is_recompiled(template, tmp_path, content):
+    expected = compile_template(template, str(tmp_path))
+    path = _cache_path(template, str(tmp_path))
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    assert compile_template(template, str(tmp_path)).specs == expected.specs
+    with open(path, 'r', encoding='utf-8') as f:
+        assert json.load(f)['version'] == compiled.CACHE_VERSION
+
+
+def test_bold_candidates_invalidate_cache(template, tmp_path, monkeypatch):
+    compile_template(template, str(tmp_path))
+    path = _cache_path(template, str(tmp_path))
+    assert compiled._load(path, template) is not None
+    # 换到装有粗体字体的机器上，缓存的解析结果不能再用
+    bold = tmp_path / 'bold.ttf'
+    bold.write_bytes(open(template.font_path, 'rb').read())
+    monkeypatch.setattr(compiled, 'BOLD_FONT_PATHS', [str(bold)])
+    assert compiled._load(path, template) is None
+    os.remove(bold)
+
+
+def test_warm_start_uses_cached_metrics(template, tmp_path):
+    cold = compile_template(template, str(tmp_path))
+    FONT_REGISTRY.clear()
+    warm = compile_template(Template(template.config), str(tmp_path))
+    assert warm.styles == cold.styles
+    assert warm.style('nav').color == '#FFD60A'
+    # 纵向度量来自缓存，不需要加载字体
+    misses = FONT_REGISTRY.misses
+    paragraph = warm.style('paragraph')
+    metrics = font_metrics(paragraph.spec)
+    assert (metrics.ascent, metrics.descent) == (paragraph.ascent, paragraph.descent)
+    assert FONT_REGISTRY.misses == misses
@@ -0,0 +1,75 @@
+import hashlib
+import io
+import json
+import re
+import tarfile
+import zipfile
+
+import pytest
+from PIL import Image
+
+from md2card.container import write_container
+from md2card.core import layout_document
+from md2card.encode import OutputOptions
+
+TEXT = '\n\n[[PAGE_BREAK]]\n\n'.join(f'# Page {i}\n\nbody of page {i}' for i in range(1, 4)) + '\n'
+
+
+@pytest.fixture
+def pages(template):
+    pages = layout_document(TEXT, template)
+    assert len(pages) == 3
+    return pages
+
+
+@pytest.mark.parametrize('fmt', ['png', 'jpeg'])
+def test_pdf_xref_points_at_objects(template, pages, tmp_path, fmt):
+    path = tmp_path / 'cards.pdf'
+    assert write_container(pages, template, str(path), 'pdf', OutputOptions(format=fmt)) == 3
+    data = path.read_bytes()
+    assert data.startswith(b'%PDF-1.4') and data.endswith(b'%%EOF\n')
+    startxref = int(re.search(rb'startxref\n(\d+)\n%%EOF\n$', data).group(1))
+    assert data[startxref:].startswith(b'xref\n')
+    header = re.match(rb'xref\n0 (\d+)\n', data[startxref:])
+    count = int(header.group(1))
+    table = data[startxref + header.end():].split(b'trailer')[0]
+    entries = [table[i:i + 20] for i in range(0, len(table), 20)]
+    assert len(entries) == count
+    assert entries[0] == b'0000000000 65535 f \n'
+    for obj_id, entry in enumerate(entries[1:], 1):
+        offset = int(entry[:10])
+        assert data[offset:].startswith(f'{obj_id} 0 obj\n'.encode('ascii'))
+    assert f'/Size {count}'.encode('ascii') in data
+    assert data.count(b'/Type /Page ') == 3
+    assert b'/Count 3' in data
+
+
+@pytest.mark.parametrize('kind', ['webp', 'tiff'])
+def test_multi_frame_counts(template, pages, tmp_path, kind):
+    path = tmp_path / f'cards.{kind}'
+    write_container(pages, template, str(path), kind, OutputOptions())
+    with Image.open(path) as img:
+        assert img.n_frames == 3
+        assert img.size == (template.width, template.height)
+
+
+@pytest.mark.parametrize('kind', ['zip', 'tar'])
+def test_archive_manifest_round_trip(template, pages, tmp_path, kind):
+    path = tmp_path / f'cards.{kind}'
+    write_container(pages, template, str(path), kind, OutputOptions(format='webp'), scale=0.5)
+    if kind == 'zip':
+        with zipfile.ZipFile(path) as archive:
+            files = {name: archive.read(name) for name in archive.namelist()}
+    else:
+        with tarfile.open(path) as archive:
+            files = {m.name: archive.extractfile(m).read() for m in archive.getmembers()}
+    manifest = json.loads(files.pop('manifest.json'))
+    assert manifest['format'] == 'webp'
+    assert [entry['name'] for entry in manifest['pages']] == list(files)
+    assert len(manifest['pages']) == 3
+    for entry in manifest['pages']:
+        data = files[entry['name']]
+        assert entry['bytes'] == len(data)
+        assert entry['sha256'] == hashlib.sha256(data).hexdigest()
+        with Image.open(io.BytesIO(data)) as img:
+            assert img.size == (entry['width'], entry['height']) == (template.width // 2, template.height // 2)
@@ -0,0 +1,21 @@
+from md2card import linebreak, metrics
+from md2card.fonts import FONT_REGISTRY
+
+from conftest import FONT
+
+
+def test_metric_tables_follow_registry_eviction(monkeypatch):
+    monkeypatch.setattr(FONT_REGISTRY, 'maxsize', 4)
+    for size in range(10, 30):
+        metrics.font_metrics((FONT, size, 0)).advance('abc')
+    keys = set(FONT_REGISTRY._fonts)
+    assert len(keys) <= 4
+    assert set(metrics._METRICS) <= keys
+    assert set(linebreak._ADVANCE_CACHE) <= keys
+
+
+def test_clear_drops_metric_tables():
+    metrics.font_metrics((FONT, 31, 0)).advance('abc')
+    FONT_REGISTRY.clear()
+    assert not metrics._METRICS
+    assert not linebreak._ADVANCE_CACHE
@@ -0,0 +1,21 @@
+import os
+
+from PIL import Image
+
+from md2card.images import ImageCache
+
+
+def test_size_cache_is_bounded_and_tracks_edits(tmp_path):
+    cache = ImageCache(max_sizes=3)
+    paths = []
+    for i in range(5):
+        path = str(tmp_path / f'{i}.png')
+        Image.new('RGB', (10 + i, 20)).save(path)
+        paths.append(path)
+        assert cache.size(path) == (10 + i, 20)
+    assert list(cache._sizes) == paths[2:]
+    # 同一路径改写后只保留新尺寸
+    Image.new('RGB', (40, 50)).save(paths[4])
+    os.utime(paths[4], ns=(1, 1))
+    assert cache.size(paths[4]) == (40, 50)
+    assert len(cache._sizes) == 3
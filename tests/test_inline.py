@@ -0,0 +1,42 @@
+from md2card.inline import inline_runs, layout_runs
+from md2card.layout import LayoutContext, RectItem, TextItem, layout_node
+from md2card.parser import parse
+
+
+def layout(text, template):
+    ctx = LayoutContext(template)
+    items, height = layout_node(parse(text)[0], ctx.left, 0, ctx)
+    return ctx, items, height
+
+
+def test_nested_list_keeps_inline_styles_and_indents(template):
+    ctx, items, _ = layout('- **bold** item\n  - child\n    - grandchild\n- next\n', template)
+    texts = [item for item in items if isinstance(item, TextItem)]
+    by_text = {item.text.strip(): item for item in texts}
+    assert 'bold' in by_text
+    assert by_text['bold'].font != by_text['item'].font or by_text['bold'].color != by_text['item'].color
+    bullets = [item.x for item in texts if item.text.startswith('•')]
+    assert len(bullets) == 4
+    assert bullets[0] == bullets[3] == ctx.left
+    assert bullets[0] < bullets[1] < bullets[2]
+
+
+def test_code_background_covers_only_the_code(template):
+    ctx, items, _ = layout('see `a b` then\n', template)
+    code = next(item for item in items if isinstance(item, TextItem) and item.text == 'a b')
+    rect = next(item for item in items if isinstance(item, RectItem))
+    width = ctx.metrics(code.font).advance('a b')
+    assert rect.box[0] == code.x - 4
+    assert rect.box[2] == code.x + width + 4
+
+
+def test_code_background_skips_trailing_space_at_line_end(template):
+    # 窄宽度迫使行内代码在空格处断行，行末空格不计入底色
+    ctx = LayoutContext(template)
+    runs = inline_runs(parse('`aaaa bbbb`\n')[0]['children'], ctx, {'font_size': 24})
+    width = ctx.metrics(runs[0].spec).advance('aaaa')
+    items, _ = layout_runs(runs, ctx, 0, 0, width + ctx.metrics(runs[0].spec).advance(' b') - 1)
+    first = next(item for item in items if isinstance(item, TextItem))
+    assert first.text == 'aaaa '
+    rect = next(item for item in items if isinstance(item, RectItem))
+    assert rect.box[2] == first.x + width + 4
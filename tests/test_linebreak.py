@@ -0,0 +1,51 @@
+import random
+
+import pytest
+from PIL import Image, ImageDraw, ImageFont
+
+from md2card.linebreak import break_lines
+
+from conftest import FONT
+
+
+def baseline_wrap_text(text, font, max_width, draw):
+    # 重构前的逐字符实现，作为 char 模式的参照
+    lines = []
+    current_line = ''
+    for char in text:
+        test_line = current_line + char
+        bbox = draw.textbbox((0, 0), test_line, font=font)
+        width = bbox[2] - bbox[0]
+        if width <= max_width:
+            current_line = test_line
+        else:
+            if current_line:
+                lines.append(current_line)
+            current_line = char
+    if current_line:
+        lines.append(current_line)
+    return lines
+
+
+ALPHABET = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789 .,;:!?()-\'"/WWWiii'
+
+
+@pytest.mark.parametrize('size', [18, 28, 44])
+@pytest.mark.parametrize('with_draw', [True, False])
+def test_char_mode_matches_baseline(size, with_draw):
+    font = ImageFont.truetype(FONT, size)
+    draw = ImageDraw.Draw(Image.new('RGB', (10, 10)))
+    rng = random.Random(size)
+    for _ in range(15):
+        text = ''.join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 160)))
+        max_width = rng.randint(size, 40 * size)
+        expected = baseline_wrap_text(text, font, max_width, draw)
+        assert break_lines(text, font, max_width, draw if with_draw else None) == expected
+
+
+def test_word_mode_keeps_words_whole():
+    font = ImageFont.truetype(FONT, 28)
+    text = 'the quick brown fox jumps over the lazy dog ' * 5
+    lines = break_lines(text, font, 300, mode='word')
+    assert ' '.join(lines).split() == text.split()
+    assert all(not line.startswith(' ') and not line.endswith(' ') for line in lines)
@@ -0,0 +1,30 @@
+import json
+
+from PIL import Image, ImageChops
+
+from md2card.core import generate_cards, generate_cards_multi, layout_key, load_template
+
+from conftest import template_config
+
+DOC = '# Title\n\nSome **bold** text, a [link](http://x) and `code`.\n\n- one\n- two\n\n> quote\n'
+
+
+def write_template(tmp_path, name, **overrides):
+    path = tmp_path / f'{name}.json'
+    path.write_text(json.dumps(template_config(**overrides)), encoding='utf-8')
+    return str(path)
+
+
+def test_text_color_variants_share_layout_and_match_single_renders(tmp_path):
+    source = tmp_path / 'doc.md'
+    source.write_text(DOC, encoding='utf-8')
+    paths = [write_template(tmp_path, 'dark', font_color='#000000'),
+             write_template(tmp_path, 'blue', font_color='#1122CC', background_color='#FFEEDD')]
+    assert layout_key(load_template(paths[0])) == layout_key(load_template(paths[1]))
+    results = generate_cards_multi(str(source), str(tmp_path / 'multi'), paths)
+    for name, path in zip(['dark', 'blue'], paths):
+        single = generate_cards(str(source), str(tmp_path / f'single_{name}'), path)
+        assert len(single) == len(results[name])
+        for a, b in zip(single, results[name]):
+            with Image.open(a) as img_a, Image.open(b) as img_b:
+                assert ImageChops.difference(img_a.convert('RGB'), img_b.convert('RGB')).getbbox() is None
@@ -0,0 +1,39 @@
+from md2card.parser import parse, split_pages
+
+
+def types(text, **kwargs):
+    return [node['type'] for node in parse(text, **kwargs)]
+
+
+def test_page_break_interrupts_blocks():
+    assert types('a\n[[PAGE_BREAK]]\nb\n') == ['paragraph', 'page_break', 'paragraph']
+    # 分页标记结束引用和列表的懒惰续行
+    assert types('> q\n[[PAGE_BREAK]]\nb\n') == ['block_quote', 'page_break', 'paragraph']
+    assert types('- x\n[[PAGE_BREAK]]\ny\n') == ['list', 'page_break', 'paragraph']
+    assert types('  [[PAGE_BREAK]]  \nz\n') == ['page_break', 'paragraph']
+
+
+def test_page_break_needs_its_own_line():
+    assert types('x [[PAGE_BREAK]] y\n') == ['paragraph']
+    # 分隔线规则仍然生效
+    assert types('---\n') == ['thematic_break']
+
+
+def test_custom_and_disabled_marker():
+    assert types('a\n<<>>\nb\n', marker='<<>>') == ['paragraph', 'page_break', 'paragraph']
+    assert 'page_break' not in types('a\n\n[[PAGE_BREAK]]\n\nb\n', marker=None)
+
+
+def test_split_pages_drops_empty_segments():
+    pages = split_pages(parse('[[PAGE_BREAK]]\n\na\n\n[[PAGE_BREAK]]\n\n[[PAGE_BREAK]]\nb\n'))
+    assert [[node['type'] for node in page if node['type'] != 'blank_line'] for page in pages] == \
+        [['paragraph'], ['paragraph']]
+
+
+def test_indented_quote_is_a_quote_not_code():
+    ast = parse('    > quoted\n    > more\n')
+    assert [node['type'] for node in ast] == ['block_quote']
+    paragraph = ast[0]['children'][0]
+    assert [child.get('raw') for child in paragraph['children']] == ['quoted', None, 'more']
+    # 普通缩进代码块不受影响
+    assert types('    code\n') == ['block_code']
@@ -0,0 +1,97 @@
+import http.client
+import io
+import json
+import threading
+import zipfile
+
+import pytest
+
+from md2card.core import iter_cards
+from md2card.server import RenderService, create_server
+from md2card.stats import collect_stats
+
+
+@pytest.fixture
+def server(template_path):
+    service = RenderService(default_template=template_path, max_body=1024)
+    httpd = create_server(service, port=0)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd.server_port
+    httpd.shutdown()
+    httpd.server_close()
+    service.close()
+
+
+def post(port, path, body, headers=None):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    conn.putrequest('POST', path)
+    if headers is None:
+        headers = {'Content-Length': str(len(body))}
+    for name, value in headers.items():
+        conn.putheader(name, value)
+    conn.endheaders()
+    conn.send(body)
+    response = conn.getresponse()
+    data = response.read()
+    conn.close()
+    return response.status, data
+
+
+def test_render_returns_zip(server):
+    status, data = post(server, '/render?format=jpeg&quality=80', b'# Hello\n\nworld\n')
+    assert status == 200
+    archive = zipfile.ZipFile(io.BytesIO(data))
+    manifest = json.loads(archive.read('manifest.json'))
+    assert manifest['format'] == 'jpeg'
+    assert [entry['name'] for entry in manifest['pages']] == archive.namelist()[:-1]
+    assert manifest['pages'][0]['name'].endswith('.jpg')
+
+
+@pytest.mark.parametrize('query', ['format=gif', 'quality=abc', 'quality=101', 'quality=-1'])
+def test_bad_output_options_are_400(server, query):
+    assert post(server, f'/render?{query}', b'text')[0] == 400
+
+
+def test_bad_content_length(server):
+    assert post(server, '/render', b'', headers={})[0] == 400
+    assert post(server, '/render', b'', headers={'Content-Length': '-5'})[0] == 400
+    assert post(server, '/render', b'', headers={'Content-Length': 'x'})[0] == 400
+
+
+def test_body_over_limit_is_413(server):
+    assert post(server, '/render', b'x' * 2048)[0] == 413
+
+
+DOC = '# Title\n\none\n\n[[PAGE_BREAK]]\n\ntwo\n\n[[PAGE_BREAK]]\n\nthree\n'
+
+
+@pytest.mark.parametrize('jobs,encode_threads', [(1, 0), (1, 2), (2, 2)])
+def test_service_encodes_in_memory_like_iter_cards(template_path, tmp_path, jobs, encode_threads):
+    expected = [(card.filename, card.data) for card in iter_cards(DOC, template_path, encode='png')]
+    service = RenderService(default_template=template_path, jobs=jobs, encode_threads=encode_threads,
+                            cache_dir=str(tmp_path / 'cache'))
+    try:
+        assert service.render(DOC) == expected
+        with collect_stats() as collected:
+            assert service.render(DOC) == expected
+        assert collected.snapshot()['counters']['cache_hits'] == 3
+    finally:
+        service.close()
+
+
+def test_stats_reach_the_collector_from_handler_threads(template_path):
+    with collect_stats() as collected:
+        service = RenderService(default_template=template_path)
+        httpd = create_server(service, port=0)
+        thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+        thread.start()
+        try:
+            assert post(httpd.server_port, '/render', DOC.encode('utf-8'))[0] == 200
+        finally:
+            httpd.shutdown()
+            httpd.server_close()
+            service.close()
+    snapshot = collected.snapshot()
+    assert snapshot['stages']['raster']['calls'] == 3
+    assert snapshot['stages']['encode']['calls'] == 3
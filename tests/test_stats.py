@@ -0,0 +1,46 @@
+import threading
+
+from md2card import stats
+
+
+def test_collect_stats_is_isolated_per_thread():
+    results = {}
+    barrier = threading.Barrier(2)
+
+    def worker(name, n):
+        with stats.collect_stats() as collected:
+            barrier.wait()
+            for _ in range(n):
+                stats.count('calls')
+            barrier.wait()
+        results[name] = collected.snapshot()['counters']
+
+    threads = [threading.Thread(target=worker, args=args) for args in (('a', 100), ('b', 7))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == {'a': {'calls': 100}, 'b': {'calls': 7}}
+    assert not stats.enabled()
+
+
+def test_nested_collect_merges_into_outer():
+    with stats.collect_stats() as outer:
+        stats.count('outer')
+        with stats.collect_stats() as inner:
+            stats.count('inner', 2)
+        assert inner.snapshot()['counters'] == {'inner': 2}
+    assert outer.snapshot()['counters'] == {'outer': 1, 'inner': 2}
+    assert not stats.enabled()
+
+
+def test_encode_threads_report_to_submitting_context(template, tmp_path):
+    from md2card.encode import EncodePool, OutputOptions
+    from md2card.markdown_render import rasterize_items
+
+    img = rasterize_items([], template)
+    with stats.collect_stats() as collected:
+        with EncodePool(OutputOptions(), threads=2) as encoder:
+            for i in range(3):
+                encoder.submit(img, str(tmp_path / f'{i}.png'), i)
+    assert collected.snapshot()['stages']['encode']['calls'] == 3
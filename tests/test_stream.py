@@ -0,0 +1,63 @@
+import io
+
+from md2card.parser import parse
+from md2card.stream import iter_chunks
+
+LOOSE_LIST = """# Title
+
+- item one
+
+  continuation of item one
+
+- item two
+
+  1. nested one
+
+  2. nested two
+
+after the list
+
+```
+code
+
+more code
+```
+
+    indented code
+
+    still indented code
+
+1. first
+
+2. second
+"""
+
+
+def streamed_blocks(text, chunk_chars=1):
+    nodes = []
+    for chunk in iter_chunks(io.StringIO(text), chunk_chars=chunk_chars):
+        nodes.extend(parse(chunk))
+    return nodes
+
+
+def test_loose_list_stays_one_block():
+    whole = parse(LOOSE_LIST)
+    assert streamed_blocks(LOOSE_LIST) == whole
+    lists = [node for node in whole if node['type'] == 'list']
+    assert len(lists) == 2
+    assert len(lists[0]['children']) == 2
+
+
+def test_chunks_cut_between_top_level_blocks():
+    chunks = list(iter_chunks(io.StringIO(LOOSE_LIST), chunk_chars=1))
+    assert ''.join(chunks) == LOOSE_LIST
+    assert chunks[0].startswith('# Title\n\n- item one')
+    assert chunks[0].endswith('  2. nested two\n\n')
+    assert any(chunk.startswith('after the list') for chunk in chunks)
+    assert not any(chunk.startswith(('  ', '- item two', '2.')) for chunk in chunks)
+
+
+def test_marker_always_cuts():
+    text = '- a\n[[PAGE_BREAK]]\n  b\n'
+    chunks = list(iter_chunks(io.StringIO(text), chunk_chars=1))
+    assert chunks == ['- a\n[[PAGE_BREAK]]\n', '  b\n']
@@ -0,0 +1,50 @@
+import re
+
+from md2card.core import layout_document
+from md2card.layout import LayoutContext, RectItem, TextItem, allocate_columns
+
+ROWS = 60
+
+
+def long_table():
+    lines = ['| Name | Description |', '| --- | --- |']
+    for i in range(ROWS):
+        # 第二列足够长，必须在单元格内折行
+        lines.append(f'| r{i} | value {i} ' + 'lorem ipsum dolor sit amet ' * 6 + '|')
+    return '\n'.join(lines) + '\n'
+
+
+def test_table_splits_on_rows_and_repeats_header(template):
+    pages = layout_document(long_table(), template)
+    assert len(pages) > 1
+    seen = []
+    per_row = None
+    for page in pages:
+        texts = [item for item in page.items if isinstance(item, TextItem)]
+        # 每页（包括续页）都以表头开始
+        assert [item.text for item in texts[:2]] == ['Name', 'Description']
+        names = [item.text for item in texts if re.fullmatch(r'r\d+', item.text)]
+        values = [item.text.split()[1] for item in texts if item.text.startswith('value ')]
+        # 行不会被拆到两页：每行的单元格和折行都在同一页
+        assert [name[1:] for name in names] == values
+        lines = len(texts) - 2 - len(names)
+        per_row = per_row or lines // len(names)
+        assert per_row > 1 and lines == per_row * len(names)
+        seen.extend(names)
+    assert seen == [f'r{i}' for i in range(ROWS)]
+
+
+def test_table_columns_fit_content_width(template):
+    ctx = LayoutContext(template)
+    page = layout_document(long_table(), template)[0]
+    rects = [item for item in page.items if isinstance(item, RectItem)]
+    assert min(rect.box[0] for rect in rects) >= ctx.left
+    assert max(rect.box[2] for rect in rects) <= ctx.left + ctx.max_text_width
+
+
+def test_allocate_columns_keeps_narrow_columns():
+    assert allocate_columns([10, 20], 100) == [10, 20]
+    widths = allocate_columns([10, 500, 300], 400)
+    assert widths[0] == 10
+    assert sum(widths) <= 400
+    assert widths[1] == widths[2]
@@ -0,0 +1,39 @@
+from PIL import Image, ImageChops, ImageDraw
+
+from conftest import FONT
+from md2card.layout import LayoutContext, TextItem, layout_node
+from md2card.parser import parse
+from md2card.textruns import TextRunCache, snap
+from md2card.fonts import FONT_REGISTRY
+
+
+def test_pasted_mask_matches_direct_draw():
+    spec = (FONT, 32, 0)
+    font = FONT_REGISTRY.load(*spec)
+    cache = TextRunCache()
+    for x, y in [(10, 20), (10.3, 20.6), (11.13, 21.88), (12.5, 19.24)]:
+        item = TextItem(x, y, 'Wavy text, 123', spec, '#224466', False)
+        pasted = Image.new('RGB', (400, 80), '#FFFFFF')
+        cache.draw(pasted, item)
+        direct = Image.new('RGB', (400, 80), '#FFFFFF')
+        ImageDraw.Draw(direct).text(snap(x, y), item.text, font=font, fill=item.color)
+        assert ImageChops.difference(pasted, direct).getbbox() is None
+
+
+def test_nearby_offsets_share_a_mask():
+    cache = TextRunCache()
+    spec = (FONT, 32, 0)
+    for y in (100.0, 130.6, 161.2, 189.9):
+        cache.get(spec, 'same', False, 10, y)
+    assert cache.misses == 1 and cache.hits == 3
+
+
+def test_list_bullets_reuse_one_mask(template):
+    ctx = LayoutContext(template)
+    items, _ = layout_node(parse('- one\n- two\n- three\n')[0], ctx.left, 0, ctx)
+    bullets = [item for item in items if isinstance(item, TextItem) and item.text == '• ']
+    assert len(bullets) == 3
+    cache = TextRunCache()
+    for item in bullets:
+        cache.get(item.font, item.text, item.fake_bold, item.x, item.y)
+    assert cache.misses == 1 and cache.hits == 2
@@ -0,0 +1,57 @@
+import os
+import random
+
+from md2card.encode import OutputOptions
+from md2card.watch import IncrementalRenderer, page_signature
+
+WORDS = 'alpha beta gamma delta epsilon zeta eta theta iota kappa lambda mu'.split()
+
+
+def random_block(rng):
+    words = lambda n: ' '.join(rng.choice(WORDS) for _ in range(n))
+    kind = rng.choice(['paragraph', 'paragraph', 'long', 'heading', 'list', 'code', 'table', 'quote', 'break'])
+    if kind == 'paragraph':
+        return words(rng.randint(3, 30))
+    if kind == 'long':
+        return words(rng.randint(150, 300))
+    if kind == 'heading':
+        return '#' * rng.randint(1, 3) + ' ' + words(3)
+    if kind == 'list':
+        return '\n'.join(f'- {words(rng.randint(2, 12))}' for _ in range(rng.randint(2, 6)))
+    if kind == 'code':
+        return '```\n' + '\n'.join(words(rng.randint(1, 6)) for _ in range(rng.randint(3, 40))) + '\n```'
+    if kind == 'table':
+        rows = ['| a | b |', '| --- | --- |'] + [f'| {words(2)} | {words(rng.randint(1, 8))} |'
+                                                 for _ in range(rng.randint(2, 30))]
+        return '\n'.join(rows)
+    if kind == 'quote':
+        return '> ' + words(rng.randint(5, 40))
+    return '[[PAGE_BREAK]]'
+
+
+def edit(blocks, rng):
+    op = rng.choice(['insert', 'delete', 'replace', 'replace'])
+    if op == 'insert' or not blocks:
+        blocks.insert(rng.randint(0, len(blocks)), random_block(rng))
+    elif op == 'delete':
+        del blocks[rng.randrange(len(blocks))]
+    else:
+        blocks[rng.randrange(len(blocks))] = random_block(rng)
+
+
+def test_random_edits_match_full_layout(template, tmp_path):
+    rng = random.Random(11)
+    options = OutputOptions(format='jpeg', quality=50)
+    live = IncrementalRenderer(template, str(tmp_path / 'live'), options=options, encode_threads=0)
+    blocks = [random_block(rng) for _ in range(25)]
+    for _ in range(20):
+        text = '\n\n'.join(blocks) + '\n'
+        live.update(text)
+        # 全量排版：新的渲染器从第一个块开始分页，不绘制
+        full = IncrementalRenderer(template, str(tmp_path / 'full'), options=options)
+        pages, ranges = full._paginate(full._entries(text), 0, 0)
+        assert [page_signature(page) for page in live.pages] == [page_signature(page) for page in pages]
+        assert live.page_ranges == ranges
+        assert sorted(os.listdir(tmp_path / 'live')) == [options.filename(i) for i in range(1, len(pages) + 1)]
+        for _ in range(rng.randint(1, 3)):
+            edit(blocks, rng)